@@ -2,14 +2,24 @@ from flask import Flask
 from flask_cors import CORS
 from flask_sqlalchemy import SQLAlchemy
 from flask_bcrypt import Bcrypt
+from flask_migrate import Migrate
 from celery import Celery
 
 
 from application.config import Config
+from application.util.pubsub import EventStream
+from application.util.location_buffer import LocationBuffer
+from application.util.positions import PositionRegistry
+from application.util.cache import Cache
 
 cors = CORS()
 db = SQLAlchemy()
 bcrypt = Bcrypt()
+migrate = Migrate()
+events = EventStream()
+locations = LocationBuffer()
+positions = PositionRegistry()
+cache = Cache()
 celery = Celery(__name__, broker=Config.CELERY_BROKER_URL, result_backend=Config.CELERY_RESULT_BACKEND)
 
 
@@ -25,6 +35,11 @@ def create_app(config_class=Config):
     cors.init_app(app)
     db.init_app(app)
     bcrypt.init_app(app)
+    migrate.init_app(app, db)
+    events.init_app(app)
+    locations.init_app(app)
+    positions.init_app(app)
+    cache.init_app(app)
     
 
     # Manulay push blueprint to app context
@@ -1,5 +1,6 @@
 from flask_restx import Model
 from flask_restx.reqparse import RequestParser
+from flask_restx.inputs import date_from_iso8601, datetime_from_iso8601
 from flask_restx.fields import String, Boolean, Integer, Float
 
 bank_model=Model(
@@ -28,14 +29,29 @@ bank_parser.add_argument('acc_holder',type=str,location="json",required=True,nul
 
 
 
+# Use on cash in hand and arrears lists
+list_parser=RequestParser(bundle_errors=True)
+list_parser.add_argument('cursor',type=str,location='args',required=False,nullable=True,help="next_cursor of previous page")
+
+# Use on balance at a time
+balance_parser=RequestParser(bundle_errors=True)
+balance_parser.add_argument('at',type=datetime_from_iso8601,location='args',required=False,nullable=True,help="ISO 8601 date time, UTC when no offset, now when not given")
+
+# Use on statement export
+statement_parser=RequestParser(bundle_errors=True)
+statement_parser.add_argument('from',type=date_from_iso8601,location='args',required=False,nullable=True,help="first date, YYYY-MM-DD")
+statement_parser.add_argument('to',type=date_from_iso8601,location='args',required=False,nullable=True,help="last date, YYYY-MM-DD, inclusive")
+statement_parser.add_argument('format',type=str,location='args',required=False,default='csv',choices=('csv','ndjson'),help="csv or ndjson")
+
+
 
 deposite_parser=RequestParser(bundle_errors=True)
-deposite_parser.add_argument('cash_in_hand_list',type=str,location="json",required=True,nullable=False,help="cash in hand list")
+deposite_parser.add_argument('order_ids',type=list,location="json",required=True,nullable=False,help="list of cash in hand order ids")
 deposite_parser.add_argument('transaction_no',type=str,location='json',required=True, nullable=False, help="transaction_no str")
 
 
 withdraw_parser=RequestParser(bundle_errors=True)
-withdraw_parser.add_argument('withdraw_list',type=str,location="json",required=True,nullable=False,help="withdraw list")
+withdraw_parser.add_argument('order_ids',type=list,location="json",required=True,nullable=False,help="list of arrears order ids")
 withdraw_parser.add_argument('note',type=str,location="json",required=False,nullable=True,help="note")
 
 
@@ -1,7 +1,15 @@
 from http import HTTPStatus
 from flask_restx import Namespace, Resource
 
-from .dto import bank_parser, bank_model, deposite_parser, withdraw_parser
+from .dto import (
+    balance_parser,
+    bank_parser,
+    bank_model,
+    deposite_parser,
+    list_parser,
+    statement_parser,
+    withdraw_parser,
+)
 from .functions import (
     delete_bank_details,
     save_bank_details,
@@ -14,7 +22,10 @@ from .functions import (
     create_withdrawal_request,
     get_arrears_list,
     get_withdrawal_list,
-    create_withdrawal_receive
+    create_withdrawal_receive,
+    get_balance,
+    get_statement,
+    get_summary,
 )
 
 
@@ -83,11 +94,19 @@ class CashInHand(Resource):
     """Handles HTTP requests to URL: /api/v1/finance/cash/list"""
 
     @finance_ns.doc(security="Bearer")
+    @finance_ns.expect(list_parser)
     @finance_ns.response(int(HTTPStatus.OK), "Query Run Successfully")
+    @finance_ns.response(int(HTTPStatus.BAD_REQUEST), "Validation error.")
     @finance_ns.response(int(HTTPStatus.INTERNAL_SERVER_ERROR), "Internal server error")
     def get(self):
-        """get all cash in hand list"""
-        return get_cash_in_hand()
+        """get cash in hand list page by page
+
+        Last item of the list holds total_cash_in_hand of all undeposited
+        orders and next_cursor, pass it as cursor to get the next page.
+        next_cursor is null on the last page.
+        """
+        data = list_parser.parse_args()
+        return get_cash_in_hand(data)
 
 
 # deposite cash
@@ -105,13 +124,15 @@ class Deposite(Resource):
     @finance_ns.expect(deposite_parser)
     @finance_ns.doc(security="Bearer")
     @finance_ns.response(int(HTTPStatus.CREATED), "deposite cash in hand")
+    @finance_ns.response(int(HTTPStatus.BAD_REQUEST), "Validation error.")
+    @finance_ns.response(int(HTTPStatus.CONFLICT), "Order not in cash in hand or already deposited.")
     @finance_ns.response(int(HTTPStatus.INTERNAL_SERVER_ERROR), "Internal server error")
     def post(self):
         """Deposite cash in hand
 
         Demo pass values
         {
-        "cash_in_hand_list": "{'1':{'order_id':'pay_id'},'2':{'order_id':'pay_id'}}",
+        "order_ids": [1, 2],
         "transaction_no": "1234"
 
         }
@@ -119,7 +140,9 @@ class Deposite(Resource):
         Intended Result
         {
             status:success/fail,
-            message:deposite,
+            message:deposited/not_in_cash_in_hand,
+            ref_no, amount on success,
+            order_ids not in cash in hand on not_in_cash_in_hand
 
         }
         """
@@ -134,14 +157,16 @@ class Withdrawa(Resource):
     @finance_ns.expect(withdraw_parser)
     @finance_ns.doc(security="Bearer")
     @finance_ns.response(int(HTTPStatus.CREATED), "withdraw")
+    @finance_ns.response(int(HTTPStatus.BAD_REQUEST), "Validation error.")
+    @finance_ns.response(int(HTTPStatus.CONFLICT), "Order arrears not open for withdrawal.")
     @finance_ns.response(int(HTTPStatus.INTERNAL_SERVER_ERROR), "Internal server error")
     def post(self):
         """withdraw
 
         Demo pass values
         {
-        "withdraw_list": "{'1':{'order_id':'pay_id'},'2':{'order_id':'pay_id'}}",
-        "withdraw_amount": "",
+        "order_ids": [1, 2],
+        "note": "",
 
 
         }
@@ -149,7 +174,8 @@ class Withdrawa(Resource):
         Intended Result
         {
             status:success/fail,
-            message:deposite,
+            message:send_request/insufficient/not_open_arrears,
+            ref_no, amount on success
 
         }
         """
@@ -172,13 +198,100 @@ class Arrears(Resource):
 
     
     @finance_ns.doc(security="Bearer")    
+    @finance_ns.expect(list_parser)
     @finance_ns.response(int(HTTPStatus.OK), "Query success")
+    @finance_ns.response(int(HTTPStatus.BAD_REQUEST), "Validation error.")
     @finance_ns.response(int(HTTPStatus.INTERNAL_SERVER_ERROR), "Internal server error")
     def get(self):
-        """get all arrears list"""
-        return get_arrears_list()
+        """get arrears list page by page
+
+        Last item of the list holds total_amnount of all open arrears
+        and next_cursor, pass it as cursor to get the next page.
+        next_cursor is null on the last page.
+        """
+        data = list_parser.parse_args()
+        return get_arrears_list(data)
+
+
+
 
+# balance at a time
+@finance_ns.route("/balance", endpoint="balance_at")
+class Balance(Resource):
+    """Handles HTTP requests to URL: /api/v1/finance/balance"""
 
+    @finance_ns.doc(security="Bearer")
+    @finance_ns.expect(balance_parser)
+    @finance_ns.response(int(HTTPStatus.OK), "Query success")
+    @finance_ns.response(int(HTTPStatus.BAD_REQUEST), "Validation error.")
+    @finance_ns.response(int(HTTPStatus.INTERNAL_SERVER_ERROR), "Internal server error")
+    def get(self):
+        """get earn, arrears, cash_in_hand and fine at a time
+
+        Computed from the balance ledger, latest snapshot before the
+        time plus the entries after it.
+        """
+        data = balance_parser.parse_args()
+        return get_balance(data)
+
+
+# home screen finance summary
+@finance_ns.route("/summary", endpoint="summary")
+class Summary(Resource):
+    """Handles HTTP requests to URL: /api/v1/finance/summary"""
+
+    @finance_ns.doc(security="Bearer")
+    @finance_ns.response(int(HTTPStatus.OK), "Query success")
+    @finance_ns.response(int(HTTPStatus.INTERNAL_SERVER_ERROR), "Internal server error")
+    def get(self):
+        """get cash in hand, arrears, withdrawals, fines and earnings
+
+        Intended Result
+        {
+            status:success,
+            cash_in_hand:"1200.00",
+            withdrawable_arrears:"5450.00",
+            pending_withdrawals:"3000.00",
+            fines:"0.00",
+            lifetime_earnings:"25400.00",
+            cash_in_hand_orders:4,
+            withdrawable_orders:12,
+            pending_withdrawal_count:1,
+            can_withdraw:true
+        }
+
+        Replaces /finance/cash, /finance/arrears/list and /finance/withdraw
+        on the home screen.
+        """
+        return get_summary()
+
+
+# statement export
+@finance_ns.route("/statement", endpoint="statement")
+class Statement(Resource):
+    """Handles HTTP requests to URL: /api/v1/finance/statement"""
+
+    @finance_ns.doc(security="Bearer")
+    @finance_ns.expect(statement_parser)
+    @finance_ns.produces(["text/csv", "application/x-ndjson"])
+    @finance_ns.response(int(HTTPStatus.OK), "Statement stream")
+    @finance_ns.response(int(HTTPStatus.BAD_REQUEST), "Validation error.")
+    @finance_ns.response(int(HTTPStatus.INTERNAL_SERVER_ERROR), "Internal server error")
+    def get(self):
+        """stream arrears, deposits, withdrawals and fines in date order
+
+        Demo pass values
+        ?from=2022-07-01&to=2022-07-31&format=csv
+
+        Intended Result
+        date,kind,ref_no,amount,order_id,note
+        2022-07-02 10:15:00,arrear,OD0000000123,450.00,123,
+        2022-07-05 08:00:00,deposit,DPD00000000012,1200.00,,TRX1029
+
+        format=ndjson gives one JSON object per line with the same keys.
+        """
+        data = statement_parser.parse_args()
+        return get_statement(data)
 
 
 @finance_ns.route("/withdraw/receive", endpoint="withdrawal_receive")
@@ -1,15 +1,26 @@
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 from http import HTTPStatus
-import ast
+from decimal import Decimal
+import csv
+import io
+import json
 from os import stat
 
 
-from flask import current_app, jsonify
-from .utils import gen_ref_key
+from flask import Response, current_app, jsonify, stream_with_context
+from sqlalchemy import func, literal, null, union_all
 
 
-from application import db
-from application.helpers import token_required
+from application import cache, db
+from application.helpers import token_required, gen_ref_key
+from application.util.cursor import encode_cursor, decode_cursor
+from .utils import (
+    add_balance,
+    balance_at,
+    can_withdraw,
+    summary_key,
+    to_decimal,
+)
 from application.models import (
     
     DeliveryBank,
@@ -19,6 +30,7 @@ from application.models import (
     DeliveryPaymentArrears,
     Order,
     DeliveryPaymentWithdrawal,
+    DeliveryPaymentFine,
 )
 
 
@@ -104,116 +116,162 @@ def delete_bank_details():
     return res
 
 
+# Undeposited COD orders of deliverer page by page
+# Total covers all undeposited orders, not only the page
 @token_required
-def get_cash_in_hand():
+def get_cash_in_hand(data):
     deliver_id = get_cash_in_hand.user_id
+    cursor = data.get("cursor")
+    limit = current_app.config.get("DISPLAY_LIST_LENGTH")
     res = []
-    cash_in_hand_total = 0
 
     try:
-        info = {}
-        delivery_payment = (
+        open_cih = (
             db.session.query(
-                DeliveryPayment.cash_in_hand,
                 DeliveryPaymentCashInHand.pay_id,
                 DeliveryPaymentCashInHand.order_id,
+                Order.net,
             )
             .join(
-                DeliveryPaymentCashInHand,
-                DeliveryPaymentCashInHand.pay_id == DeliveryPayment.id,
+                DeliveryPayment,
+                DeliveryPayment.id == DeliveryPaymentCashInHand.pay_id,
             )
+            .join(Order, Order.id == DeliveryPaymentCashInHand.order_id)
             .filter(
                 DeliveryPayment.deliverer_id == deliver_id,
                 DeliveryPaymentCashInHand.is_deposit == False,
             )
+        )
+        cash_in_hand_total = open_cih.with_entities(
+            func.coalesce(func.sum(Order.net), 0)
+        ).scalar()
+
+        page = open_cih
+        if cursor:
+            last_order_id, = decode_cursor(cursor, int)
+            page = page.filter(DeliveryPaymentCashInHand.order_id < last_order_id)
+        # Fetch one extra row to know whether there is a next page
+        page = (
+            page.order_by(DeliveryPaymentCashInHand.order_id.desc())
+            .limit(limit + 1)
             .all()
         )
 
-        for i in delivery_payment:
-            order_id = i.order_id
-            print(order_id)
-            order_data = (
-                db.session.query(Order.id, Order.net).filter_by(id=order_id).first()
-            )
-            print(order_data)
+        next_cursor = None
+        if len(page) > limit:
+            page = page[:limit]
+            next_cursor = encode_cursor(page[-1].order_id)
 
+        for i in page:
             info = {
                 "pay_id": i.pay_id,
                 "order_id": i.order_id,
-                "amount": order_data.net,
+                "amount": i.net,
             }
-            cash_in_hand_total = cash_in_hand_total + order_data.net
-
             res.append(info)
 
-        info2 = {"total_cash_in_hand": cash_in_hand_total}
+        info2 = {"total_cash_in_hand": cash_in_hand_total, "next_cursor": next_cursor}
         res.append(info2)
         res = jsonify(res)
         res.status_code = HTTPStatus.OK
 
+    except ValueError as e:
+        res = jsonify(status="fail", message=str(e))
+        res.status_code = HTTPStatus.BAD_REQUEST
     except Exception as e:
         res = jsonify(status="fail", message=str(e))
         res.status_code = HTTPStatus.INTERNAL_SERVER_ERROR
     return res
 
 
+# Deposit cash collected for the given COD orders
+# Orders are locked and marked deposited in bulk, all or none
 @token_required
 def deposite_cash_in_hand(data):
-    cash_list = data.get("cash_in_hand_list")
+    order_ids = data.get("order_ids")
     transaction_no = data.get("transaction_no")
     res = {}
 
     deliverer_id = deposite_cash_in_hand.user_id
 
     try:
+        if not order_ids or not all(isinstance(i, int) for i in order_ids):
+            raise ValueError("invalid_order_ids")
+        order_ids = set(order_ids)
 
-        result = ast.literal_eval(cash_list)
-        ref_no = gen_ref_key(DeliveryPaymentDeposit, "DPD")
-        date = datetime.now()
-        amount = 0
-        pay_id = 0
-        for id, info in result.items():
-            for key in info:
-                order_id = key
-                pay_id = info[key]
-
-            print(" order_id: " + order_id, "pay_id: " + pay_id)
-            order_data = (
-                db.session.query(Order.id, Order.net).filter_by(id=order_id).first()
+        delivery_payment = (
+            db.session.query(DeliveryPayment)
+            .filter_by(deliverer_id=deliverer_id)
+            .first()
+        )
+        if not delivery_payment:
+            raise ValueError("no_cash_in_hand")
+
+        # Lock undeposited rows so the same cash is not deposited twice
+        cash_in_hand = (
+            db.session.query(DeliveryPaymentCashInHand.order_id, Order.net)
+            .join(Order, Order.id == DeliveryPaymentCashInHand.order_id)
+            .filter(
+                DeliveryPaymentCashInHand.pay_id == delivery_payment.id,
+                DeliveryPaymentCashInHand.order_id.in_(order_ids),
+                DeliveryPaymentCashInHand.is_deposit == False,
             )
-            amount = amount + order_data.net
-        print(amount)
+            .with_for_update(of=DeliveryPaymentCashInHand)
+            .all()
+        )
+        if len(cash_in_hand) != len(order_ids):
+            db.session.rollback()
+            missing = sorted(order_ids - {i.order_id for i in cash_in_hand})
+            res = jsonify(status="fail", message="not_in_cash_in_hand", order_ids=missing)
+            res.status_code = HTTPStatus.CONFLICT
+            return res
+        amount = sum(i.net for i in cash_in_hand)
 
         # deposite cash in hand
         new_deposite = DeliveryPaymentDeposit(
-            ref_no=ref_no,
+            ref_no=gen_ref_key("DPD"),
             amount=amount,
-            date=date,
+            date=datetime.now(),
             transaction_no=transaction_no,
-            pay_id=pay_id,
+            pay_id=delivery_payment.id,
         )
         db.session.add(new_deposite)
         db.session.flush()
 
+        # mark orders deposited
+        db.session.query(DeliveryPaymentCashInHand).filter(
+            DeliveryPaymentCashInHand.pay_id == delivery_payment.id,
+            DeliveryPaymentCashInHand.order_id.in_(order_ids),
+            DeliveryPaymentCashInHand.is_deposit == False,
+        ).update(
+            {
+                DeliveryPaymentCashInHand.is_deposit: True,
+                DeliveryPaymentCashInHand.deposit_id: new_deposite.id,
+            },
+            synchronize_session=False,
+        )
+
         # update cash in hand
-        delivery_payment = (
-            db.session.query(DeliveryPayment)
-            .filter_by(deliverer_id=deliverer_id)
-            .first()
+        add_balance(
+            deliverer_id, "deposit", ref_no=new_deposite.ref_no, cash_in_hand=-amount
         )
-        cash = delivery_payment.cash_in_hand
-        delivery_payment.cash_in_hand = cash - amount
-        print(delivery_payment.cash_in_hand)
         db.session.commit()
 
         res = jsonify(
             status="success",
             message="deposited",
+            ref_no=new_deposite.ref_no,
+            amount=amount,
         )
 
         res.status_code = HTTPStatus.CREATED
 
+    except ValueError as e:
+        db.session.rollback()
+        res = jsonify(status="fail", message=str(e))
+        res.status_code = HTTPStatus.BAD_REQUEST
     except Exception as e:
+        db.session.rollback()
         res = jsonify(status="fail", message=str(e))
         res.status_code = HTTPStatus.INTERNAL_SERVER_ERROR
     return res
@@ -258,119 +316,107 @@ def get_deposited_list():
     return res
 
 
+# Request withdrawal of arrears of the given orders
+# Arrears are linked to the withdrawal with one update, amount is their sum
 @token_required
 def create_withdrawal_request(data):
-    withdraw_list = data.get("withdraw_list")
+    order_ids = data.get("order_ids")
     note=data.get("note")
     deliver_id = create_withdrawal_request.user_id
     res = {}
-    message = ""
-    total_amount = 0
-    arrears = 0
-    result = ast.literal_eval(withdraw_list)
-    ref_no = gen_ref_key(DeliveryPaymentWithdrawal, "DPW")
-    date = datetime.now()
-
-    p_id = 0
 
     try:
-        #get current arrears
-        arrears_q = (
-            db.session.query(
-                DeliveryPaymentArrears.id,
-                DeliveryPaymentArrears.amount,
-                DeliveryPaymentArrears.order_id,
-                DeliveryPaymentArrears.pay_id,
-                DeliveryPaymentArrears.withdrawl_id,
-                DeliveryPayment.arrears,
-                DeliveryPayment.id,
-            )
-            .join(DeliveryPayment, DeliveryPayment.id == DeliveryPaymentArrears.pay_id)
+        if not order_ids or not all(isinstance(i, int) for i in order_ids):
+            raise ValueError("invalid_order_ids")
+        order_ids = set(order_ids)
+
+        delivery_payment = (
+            db.session.query(DeliveryPayment)
+            .filter_by(deliverer_id=deliver_id)
+            .first()
+        )
+        arrears = delivery_payment.arrears if delivery_payment else None
+
+        #check arrears reach MIN_WITHDRAWAL_AMOUNT, same rule as the summary
+        if not can_withdraw(arrears, len(order_ids)):
+            res = jsonify(status="fail", message="insufficient")
+            res.status_code = HTTPStatus.OK
+            return res
+
+        #create new DeliveryPaymentWithdrawal
+        new_withdraw = DeliveryPaymentWithdrawal(
+            ref_no=gen_ref_key("DPW"),
+            amount=0,
+            date=datetime.now(),
+            note=note,
+            pay_id=delivery_payment.id,
+        )
+        db.session.add(new_withdraw)
+        db.session.flush()
+
+        #link open arrears of the orders to the withdrawal
+        linked = (
+            db.session.query(DeliveryPaymentArrears)
             .filter(
-                DeliveryPayment.deliverer_id == deliver_id,
+                DeliveryPaymentArrears.order_id.in_(order_ids),
+                DeliveryPaymentArrears.pay_id == delivery_payment.id,
+                DeliveryPaymentArrears.withdrawl_id == None,
                 DeliveryPaymentArrears.is_receive == False,
                 DeliveryPaymentArrears.is_deduct == False,
-                DeliveryPaymentArrears.withdrawl_id == None,
             )
-            .all()
-        )
-
-        for i in arrears_q:
-            arrears = i.arrears            
-            p_id=i.pay_id       
-        
-        #check whether arrears is greater than MIN_WITHDRAWAL_AMOUNT
-        if arrears >= current_app.config.get("MIN_WITHDRAWAL_AMOUNT"):
-            #create new DeliveryPaymentWithdrawal
-            new_withdraw=DeliveryPaymentWithdrawal(ref_no=ref_no,amount=0,date=date,note=note,pay_id=p_id)
-            db.session.add(new_withdraw)            
-            db.session.flush()
-            
-
-            # update arrears in DeliveryPayment
-            delivery_payment = (
-                db.session.query(DeliveryPayment)
-                .filter_by(deliverer_id=deliver_id)
-                .first()
+            .update(
+                {DeliveryPaymentArrears.withdrawl_id: new_withdraw.id},
+                synchronize_session=False,
             )
-                      
-
-            #update deliverypaymentarrears
-            for id, info in result.items():
-                for key in info:
-                    ord_id = key
-                    pay_id = info[key]
-
-                delivery_payment_arrears=db.session.query(DeliveryPaymentArrears).filter_by(order_id=ord_id).first()
-                total_amount=total_amount+delivery_payment_arrears.amount                
-                delivery_payment_arrears.withdrawl_id=new_withdraw.id
-                db.session.flush()
-                
-
-                status='success'
-                message="send_request"
-            
-            #update withdraw amount
-            new_withdraw.amount=total_amount
-            delivery_payment.arrears = arrears - total_amount
-            db.session.commit()
-
-        else:
-            status='fail'
-            message="insufficient"
+        )
+        if linked != len(order_ids):
+            db.session.rollback()
+            res = jsonify(status="fail", message="not_open_arrears")
+            res.status_code = HTTPStatus.CONFLICT
+            return res
+
+        total_amount = (
+            db.session.query(func.coalesce(func.sum(DeliveryPaymentArrears.amount), 0))
+            .filter(DeliveryPaymentArrears.withdrawl_id == new_withdraw.id)
+            .scalar()
+        )
 
-                
+        #update withdraw amount
+        new_withdraw.amount=total_amount
+        add_balance(
+            deliver_id, "withdrawal", ref_no=new_withdraw.ref_no, arrears=-total_amount
+        )
+        db.session.commit()
 
-        res = jsonify(status=status, message=message)
+        res = jsonify(status="success", message="send_request", ref_no=new_withdraw.ref_no, amount=total_amount)
         res.status_code = HTTPStatus.OK
 
+    except ValueError as e:
+        db.session.rollback()
+        res = jsonify(status="fail", message=str(e))
+        res.status_code = HTTPStatus.BAD_REQUEST
     except Exception as e:
-        
+        db.session.rollback()
         res = jsonify(status="fail", message=str(e))
         res.status_code = HTTPStatus.INTERNAL_SERVER_ERROR
     return res
 
 
+# Arrears open for withdrawal page by page
+# Total covers all open arrears, not only the page
 @token_required
-def get_arrears_list():
+def get_arrears_list(data):
     deliver_id = get_arrears_list.user_id
+    cursor = data.get("cursor")
+    limit = current_app.config.get("DISPLAY_LIST_LENGTH")
     res = []
-    total_amount = 0
-    arrears = 0
 
     try:
-        info = {}
-        withdraw_q = (
+        open_arrears = (
             db.session.query(
-                DeliveryPaymentArrears.id,
                 DeliveryPaymentArrears.amount,
-                DeliveryPaymentArrears.is_receive,
-                DeliveryPaymentArrears.is_deduct,
                 DeliveryPaymentArrears.order_id,
                 DeliveryPaymentArrears.pay_id,
-                DeliveryPaymentArrears.withdrawl_id,
-                DeliveryPayment.arrears,
-                DeliveryPayment.id,
             )
             .join(DeliveryPayment, DeliveryPayment.id == DeliveryPaymentArrears.pay_id)
             .filter(
@@ -379,22 +425,39 @@ def get_arrears_list():
                 DeliveryPaymentArrears.is_deduct == False,
                 DeliveryPaymentArrears.withdrawl_id == None,
             )
+        )
+        total_amount = open_arrears.with_entities(
+            func.coalesce(func.sum(DeliveryPaymentArrears.amount), 0)
+        ).scalar()
+
+        page = open_arrears
+        if cursor:
+            last_order_id, = decode_cursor(cursor, int)
+            page = page.filter(DeliveryPaymentArrears.order_id < last_order_id)
+        # Fetch one extra row to know whether there is a next page
+        page = (
+            page.order_by(DeliveryPaymentArrears.order_id.desc())
+            .limit(limit + 1)
             .all()
         )
 
-        for i in withdraw_q:
-            print(i.arrears)
-            arrears = i.arrears
-            total_amount = total_amount + i.amount
+        next_cursor = None
+        if len(page) > limit:
+            page = page[:limit]
+            next_cursor = encode_cursor(page[-1].order_id)
 
+        for i in page:
             info = {"amount": i.amount, "order_id": i.order_id, "pay_id": i.pay_id}
-
             res.append(info)
-        info2 = {"total_amnount": arrears}
+
+        info2 = {"total_amnount": total_amount, "next_cursor": next_cursor}
         res.append(info2)
         res = jsonify(res)
         res.status_code = HTTPStatus.OK
 
+    except ValueError as e:
+        res = jsonify(status="fail", message=str(e))
+        res.status_code = HTTPStatus.BAD_REQUEST
     except Exception as e:
         res = jsonify(status="fail", message=str(e))
         res.status_code = HTTPStatus.INTERNAL_SERVER_ERROR
@@ -461,3 +524,261 @@ def create_withdrawal_receive():
         res = jsonify(Status="Fail", message=str(e))
         res.status_code = HTTPStatus.INTERNAL_SERVER_ERROR
     return res
+
+
+# Balances of deliverer at a time, from ledger snapshot and entries after it
+@token_required
+def get_balance(data):
+    deliver_id = get_balance.user_id
+    at = data.get("at")
+
+    try:
+        if at and at.tzinfo:
+            at = at.astimezone(timezone.utc).replace(tzinfo=None)
+        res = balance_at(deliver_id, at)
+        res["at"] = (at or datetime.utcnow()).strftime("%Y-%m-%d %H:%M:%S")
+        res = jsonify(res)
+        res.status_code = HTTPStatus.OK
+
+    except Exception as e:
+        res = jsonify(status="fail", message=str(e))
+        res.status_code = HTTPStatus.INTERNAL_SERVER_ERROR
+    return res
+
+
+# Statement columns in output order
+STATEMENT_FIELDS = ("date", "kind", "ref_no", "amount", "order_id", "note")
+
+
+# Arrears, deposits, withdrawals and fines of deliverer in date order
+# Each part is filtered on its (pay_id, date) index, arrears on order date
+def _statement_query(pay_id, date_from, date_to):
+    def in_range(column):
+        conds = []
+        if date_from:
+            conds.append(column >= date_from)
+        if date_to:
+            conds.append(column < date_to + timedelta(days=1))
+        return conds
+
+    arrears = (
+        db.select(
+            Order.date.label("date"),
+            literal("arrear").label("kind"),
+            Order.ref_no.label("ref_no"),
+            DeliveryPaymentArrears.amount.label("amount"),
+            DeliveryPaymentArrears.order_id.label("order_id"),
+            DeliveryPaymentArrears.note.label("note"),
+        )
+        .join(Order, Order.id == DeliveryPaymentArrears.order_id)
+        .where(DeliveryPaymentArrears.pay_id == pay_id, *in_range(Order.date))
+    )
+    deposits = db.select(
+        DeliveryPaymentDeposit.date,
+        literal("deposit"),
+        DeliveryPaymentDeposit.ref_no,
+        DeliveryPaymentDeposit.amount,
+        null(),
+        DeliveryPaymentDeposit.transaction_no,
+    ).where(
+        DeliveryPaymentDeposit.pay_id == pay_id,
+        *in_range(DeliveryPaymentDeposit.date),
+    )
+    withdrawals = db.select(
+        DeliveryPaymentWithdrawal.date,
+        literal("withdrawal"),
+        DeliveryPaymentWithdrawal.ref_no,
+        DeliveryPaymentWithdrawal.amount,
+        null(),
+        DeliveryPaymentWithdrawal.note,
+    ).where(
+        DeliveryPaymentWithdrawal.pay_id == pay_id,
+        DeliveryPaymentWithdrawal.is_cancel == False,
+        *in_range(DeliveryPaymentWithdrawal.date),
+    )
+    fines = db.select(
+        DeliveryPaymentFine.date,
+        literal("fine"),
+        DeliveryPaymentFine.ref_no,
+        DeliveryPaymentFine.amount,
+        null(),
+        DeliveryPaymentFine.note,
+    ).where(
+        DeliveryPaymentFine.pay_id == pay_id,
+        DeliveryPaymentFine.is_cancel == False,
+        *in_range(DeliveryPaymentFine.date),
+    )
+    statement = union_all(arrears, deposits, withdrawals, fines).subquery()
+    return db.session.query(statement).order_by(statement.c.date, statement.c.kind)
+
+
+# Statement row to output values
+def _statement_values(row):
+    return {
+        "date": row.date.strftime("%Y-%m-%d %H:%M:%S") if row.date else None,
+        "kind": row.kind,
+        "ref_no": row.ref_no,
+        "amount": str(row.amount) if row.amount is not None else None,
+        "order_id": row.order_id,
+        "note": row.note,
+    }
+
+
+# Stream statement of deliverer as CSV or NDJSON
+# Rows come from a server side cursor, memory does not grow with the range
+@token_required
+def get_statement(data):
+    deliver_id = get_statement.user_id
+    date_from = data.get("from")
+    date_to = data.get("to")
+    out_format = data.get("format") or "csv"
+
+    try:
+        pay_id = (
+            db.session.query(DeliveryPayment.id)
+            .filter_by(deliverer_id=deliver_id)
+            .scalar()
+        )
+        rows = (
+            _statement_query(pay_id, date_from, date_to)
+            .execution_options(stream_results=True)
+            .yield_per(current_app.config.get("STATEMENT_BATCH_SIZE"))
+        )
+
+        def stream_csv():
+            buf = io.StringIO()
+            writer = csv.DictWriter(buf, fieldnames=STATEMENT_FIELDS)
+            writer.writeheader()
+            for row in rows:
+                writer.writerow(_statement_values(row))
+                yield buf.getvalue()
+                buf.seek(0)
+                buf.truncate()
+            if buf.tell():
+                yield buf.getvalue()
+
+        def stream_ndjson():
+            for row in rows:
+                yield json.dumps(_statement_values(row)) + "\n"
+
+        if out_format == "ndjson":
+            res = Response(stream_with_context(stream_ndjson()), mimetype="application/x-ndjson")
+        else:
+            res = Response(stream_with_context(stream_csv()), mimetype="text/csv")
+            res.headers["Content-Disposition"] = "attachment; filename=statement.csv"
+        res.headers["X-Accel-Buffering"] = "no"
+
+    except Exception as e:
+        res = jsonify(status="fail", message=str(e))
+        res.status_code = HTTPStatus.INTERNAL_SERVER_ERROR
+    return res
+
+
+# Summary totals in response order
+SUMMARY_FIELDS = (
+    "cash_in_hand",
+    "withdrawable_arrears",
+    "pending_withdrawals",
+    "fines",
+    "lifetime_earnings",
+)
+
+
+# Totals and counts of the summary fields of deliverer, with the arrears
+# balance and the ledger version they were read at
+# One grouped aggregate over the union of the rows behind each field
+def _summary_totals(deliverer_id):
+    pay_id = (
+        db.select(DeliveryPayment.id)
+        .where(DeliveryPayment.deliverer_id == deliverer_id)
+        .scalar_subquery()
+    )
+    parts = union_all(
+        db.select(literal("cash_in_hand").label("field"), Order.net.label("amount"))
+        .select_from(DeliveryPaymentCashInHand)
+        .join(Order, Order.id == DeliveryPaymentCashInHand.order_id)
+        .where(
+            DeliveryPaymentCashInHand.pay_id == pay_id,
+            DeliveryPaymentCashInHand.is_deposit == False,
+        ),
+        db.select(literal("withdrawable_arrears"), DeliveryPaymentArrears.amount).where(
+            DeliveryPaymentArrears.pay_id == pay_id,
+            DeliveryPaymentArrears.is_receive == False,
+            DeliveryPaymentArrears.is_deduct == False,
+            DeliveryPaymentArrears.withdrawl_id == None,
+        ),
+        db.select(literal("pending_withdrawals"), DeliveryPaymentWithdrawal.amount).where(
+            DeliveryPaymentWithdrawal.pay_id == pay_id,
+            DeliveryPaymentWithdrawal.is_complete == False,
+            DeliveryPaymentWithdrawal.is_cancel == False,
+        ),
+        db.select(literal("fines"), DeliveryPaymentFine.amount).where(
+            DeliveryPaymentFine.pay_id == pay_id,
+            DeliveryPaymentFine.is_complete == False,
+            DeliveryPaymentFine.is_cancel == False,
+        ),
+        db.select(literal("lifetime_earnings"), DeliveryPayment.earn).where(
+            DeliveryPayment.deliverer_id == deliverer_id
+        ),
+        db.select(literal("arrears"), DeliveryPayment.arrears).where(
+            DeliveryPayment.deliverer_id == deliverer_id
+        ),
+        db.select(literal("version"), DeliveryPayment.ledger_seq).where(
+            DeliveryPayment.deliverer_id == deliverer_id
+        ),
+    ).subquery()
+    rows = db.session.execute(
+        db.select(
+            parts.c.field,
+            func.coalesce(func.sum(parts.c.amount), 0),
+            func.count(parts.c.amount),
+        ).group_by(parts.c.field)
+    )
+
+    totals = {field: (Decimal("0.00"), 0) for field in SUMMARY_FIELDS + ("arrears",)}
+    version = 0
+    for field, amount, count in rows:
+        if field == "version":
+            version = int(amount)
+        else:
+            totals[field] = (to_decimal(amount).quantize(Decimal("0.01")), count)
+    return totals, version
+
+
+# Cash in hand, arrears, withdrawals, fines and earnings of deliverer
+# Cached per deliverer under the ledger version, a finance write moves the
+# version on in its own transaction so a stale summary is never served
+@token_required
+def get_summary():
+    deliver_id = get_summary.user_id
+
+    try:
+        version = (
+            db.session.query(DeliveryPayment.ledger_seq)
+            .filter_by(deliverer_id=deliver_id)
+            .scalar()
+        ) or 0
+        info = cache.get(summary_key(deliver_id, version))
+        if info is None:
+            totals, version = _summary_totals(deliver_id)
+            info = {field: str(totals[field][0]) for field in SUMMARY_FIELDS}
+            info["cash_in_hand_orders"] = totals["cash_in_hand"][1]
+            info["withdrawable_orders"] = totals["withdrawable_arrears"][1]
+            info["pending_withdrawal_count"] = totals["pending_withdrawals"][1]
+            info["can_withdraw"] = can_withdraw(
+                totals["arrears"][0], totals["withdrawable_arrears"][1]
+            )
+            # Stored under the version the totals were read at
+            cache.set(
+                summary_key(deliver_id, version),
+                info,
+                current_app.config.get("FINANCE_SUMMARY_TTL"),
+            )
+
+        res = jsonify(status="success", **info)
+        res.status_code = HTTPStatus.OK
+
+    except Exception as e:
+        res = jsonify(status="fail", message=str(e))
+        res.status_code = HTTPStatus.INTERNAL_SERVER_ERROR
+    return res
@@ -1,9 +1,146 @@
-import datetime
+from datetime import datetime
+from decimal import Decimal
 
-# Generate unique material ref key
-def gen_ref_key(tbl, type):
-    count = tbl.query.count()
-    count += 1
-    return type+str(count)+'-'+datetime.datetime.now().strftime('%y%m%d')
+from flask import current_app
+from sqlalchemy import func
 
+from application import db
+from application.models import (
+    DeliveryLedger,
+    DeliveryLedgerSnapshot,
+    DeliveryPayment,
+    DeliveryUser,
+)
 
+
+# Balances of DeliveryPayment changed through add_balance
+BALANCE_COLUMNS = ("earn", "arrears", "cash_in_hand", "fine")
+
+
+# Cache key of the finance summary of deliverer at a ledger version
+# ledger_seq is bumped by add_balance in the transaction of every finance
+# write, a summary cached at an older version is never read again
+def summary_key(deliverer_id, version):
+    return f"finance:summary:{deliverer_id}:{version}"
+
+
+# Whether deliverer can request withdrawal of open_count open arrears
+# with arrears balance, used by the request and by the summary
+def can_withdraw(arrears, open_count):
+    return open_count > 0 and (arrears or 0) >= current_app.config.get(
+        "MIN_WITHDRAWAL_AMOUNT"
+    )
+
+
+# Exact decimal of an amount, floats go through str to drop binary noise
+def to_decimal(amount):
+    if isinstance(amount, float):
+        return Decimal(str(amount))
+    return Decimal(amount)
+
+
+# Add amounts to balances of deliverer in the database
+# Single UPDATE balance = balance + delta, never read-modify-write, the
+# row stays locked until the caller commits
+# Each change is appended to the ledger as kind, a snapshot of all
+# balances is taken every LEDGER_SNAPSHOT_EVERY entries
+# Returns row with id and new balances
+# add_balance(deliverer_id, "cod", order_id=ord_id, cash_in_hand=net)
+def add_balance(deliverer_id, kind, ref_no=None, order_id=None, **deltas):
+    deltas = {name: to_decimal(amount) for name, amount in deltas.items()}
+    values = {}
+    for name, delta in deltas.items():
+        if name not in BALANCE_COLUMNS:
+            raise ValueError("invalid_balance")
+        column = getattr(DeliveryPayment, name)
+        values[column] = func.coalesce(column, 0) + delta
+    values[DeliveryPayment.ledger_seq] = DeliveryPayment.ledger_seq + len(deltas)
+
+    if not _update_balance(deliverer_id, values):
+        # First payment of deliverer, lock the user so only one row is created
+        db.session.query(DeliveryUser.id).filter_by(id=deliverer_id).with_for_update().first()
+        if not _update_balance(deliverer_id, values):
+            db.session.add(
+                DeliveryPayment(deliverer_id=deliverer_id, ledger_seq=len(deltas), **deltas)
+            )
+            db.session.flush()
+
+    row = (
+        db.session.query(
+            DeliveryPayment.id,
+            DeliveryPayment.ledger_seq,
+            *[getattr(DeliveryPayment, name) for name in BALANCE_COLUMNS],
+        )
+        .filter_by(deliverer_id=deliverer_id)
+        .first()
+    )
+
+    date = datetime.utcnow()
+    db.session.execute(
+        DeliveryLedger.__table__.insert(),
+        [
+            dict(
+                kind=kind,
+                balance=name,
+                amount=delta,
+                ref_no=ref_no,
+                order_id=order_id,
+                date=date,
+                deliverer_id=deliverer_id,
+            )
+            for name, delta in deltas.items()
+        ],
+    )
+
+    every = current_app.config.get("LEDGER_SNAPSHOT_EVERY")
+    if row.ledger_seq // every != (row.ledger_seq - len(deltas)) // every:
+        ledger_id = (
+            db.session.query(func.max(DeliveryLedger.id))
+            .filter(DeliveryLedger.deliverer_id == deliverer_id)
+            .scalar()
+        )
+        db.session.add(
+            DeliveryLedgerSnapshot(
+                ledger_id=ledger_id,
+                date=date,
+                deliverer_id=deliverer_id,
+                **{name: getattr(row, name) for name in BALANCE_COLUMNS},
+            )
+        )
+        db.session.flush()
+    return row
+
+
+def _update_balance(deliverer_id, values):
+    return (
+        db.session.query(DeliveryPayment)
+        .filter_by(deliverer_id=deliverer_id)
+        .update(values, synchronize_session=False)
+    )
+
+
+# Balances of deliverer at a time, now when at is None
+# Latest snapshot before it plus the ledger entries after the snapshot
+def balance_at(deliverer_id, at=None):
+    snapshot = db.session.query(DeliveryLedgerSnapshot).filter(
+        DeliveryLedgerSnapshot.deliverer_id == deliverer_id
+    )
+    if at:
+        snapshot = snapshot.filter(DeliveryLedgerSnapshot.date <= at)
+    snapshot = snapshot.order_by(DeliveryLedgerSnapshot.ledger_id.desc()).first()
+
+    balances = {
+        name: (getattr(snapshot, name) if snapshot else None) or Decimal("0.00")
+        for name in BALANCE_COLUMNS
+    }
+    tail = db.session.query(
+        DeliveryLedger.balance, func.sum(DeliveryLedger.amount)
+    ).filter(
+        DeliveryLedger.deliverer_id == deliverer_id,
+        DeliveryLedger.id > (snapshot.ledger_id if snapshot else 0),
+    )
+    if at:
+        tail = tail.filter(DeliveryLedger.date <= at)
+    for name, amount in tail.group_by(DeliveryLedger.balance).all():
+        balances[name] += to_decimal(amount)
+    return balances
@@ -6,6 +6,7 @@ from flask import current_app, jsonify
 
 from application import db
 from application.helpers import token_required
+from application.util.order_state import PICKED, STATE_NAMES
 from application.models import (
     Order,
     OrderMobile,
@@ -46,14 +47,14 @@ def get_completed_list():
                 Order.date,
                 Order.net,
                 OrderMobile.cus_id,
-                OrderMobile.is_deliver,
                 SellerProfile.organization,
                 SellerProfile.street_address,
             )
             .join(OrderMobile, OrderMobile.order_id == Order.id)
             .join(SellerProfile, SellerProfile.id == Order.seller_prof)
             .filter(
-                OrderMobile.deliverer_id == deliverer_id, OrderMobile.is_deliver == True
+                OrderMobile.deliverer_id == deliverer_id,
+                OrderMobile.state.in_(STATE_NAMES["delivered"]),
             )
             .all()
         )
@@ -94,7 +95,6 @@ def get_failed_list():
                 Order.date,
                 Order.net,
                 OrderMobile.cus_id,
-                OrderMobile.is_deliver,
                 SellerProfile.organization,
                 SellerProfile.street_address,
             )
@@ -102,8 +102,7 @@ def get_failed_list():
             .join(SellerProfile, SellerProfile.id == Order.seller_prof)
             .filter(
                 OrderMobile.deliverer_id == deliverer_id,
-                OrderMobile.is_deliver == False,
-                OrderMobile.is_pick == True,
+                OrderMobile.state == PICKED,
             )
             .all()
         )
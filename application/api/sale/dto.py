@@ -9,6 +9,31 @@ from flask_restx.reqparse import RequestParser
 order_id_parser=RequestParser(bundle_errors=True)
 order_id_parser.add_argument('order_id',type=int,location='json',required=True, nullable=False, help="order id int")
 
+# Use on batched order transitions
+transition_parser=RequestParser(bundle_errors=True)
+transition_parser.add_argument('transitions',type=list,location='json',required=True, nullable=False, help="list of {order_id:int, action:accept|pickup|deliver, client_ts:ISO 8601 time of the action}, at most TRANSITION_BATCH_LENGTH")
+
+# Use on order list
+order_list_parser=RequestParser(bundle_errors=True)
+order_list_parser.add_argument('cursor',type=str,location='args',required=False, nullable=True, help="next_cursor of previous page")
+order_list_parser.add_argument('state',type=str,location='args',required=False, nullable=True, choices=('pending','picked','delivered'), help="pending, picked or delivered")
+order_list_parser.add_argument('since',type=str,location='args',required=False, nullable=True, help="sync_token of previous call, returns changed orders only")
+
+# Use on nearby orders
+nearby_parser=RequestParser(bundle_errors=True)
+nearby_parser.add_argument('latitude',type=float,location='args',required=True, nullable=False, help="deliverer latitude")
+nearby_parser.add_argument('longitude',type=float,location='args',required=True, nullable=False, help="deliverer longitude")
+
+# Use on route planning
+route_parser=nearby_parser.copy()
+route_parser.add_argument('time_budget',type=int,location='args',required=False, nullable=True, help="planning time in milliseconds")
+
+# Use on return list
+return_list_parser=RequestParser(bundle_errors=True)
+return_list_parser.add_argument('cursor',type=str,location='args',required=False, nullable=True, help="next_cursor of previous page")
+return_list_parser.add_argument('state',type=str,location='args',required=False, nullable=True, choices=('pending','complete'), help="pending or complete")
+return_list_parser.add_argument('since',type=str,location='args',required=False, nullable=True, help="sync_token of previous call, returns changed returns only")
+
 
 
 
@@ -1,9 +1,15 @@
 from http import HTTPStatus
+from flask import request
 from flask_restx import Namespace, Resource
 
 
 from .dto import (
-    order_id_parser
+    order_id_parser,
+    order_list_parser,
+    transition_parser,
+    nearby_parser,
+    route_parser,
+    return_list_parser,
 )
 
 from .functions import (
@@ -18,6 +24,11 @@ from .functions import (
     get_return_details,
     get_return_list,  
     create_accept_order,
+    create_order_transitions,
+    create_dispatch,
+    get_nearby_orders,
+    get_order_route,
+    get_event_stream,
 
 
 
@@ -93,20 +104,147 @@ class DeliverOrder(Resource):
 
 
 
+# order accept, pickup and deliver in one request
+@sale_ns.route("/order/transitions", endpoint="order_transitions")
+class OrderTransitions(Resource):
+    """Handles HTTP requests to URL: /api/v1/sale/order/transitions"""
+
+    @sale_ns.doc(security="Bearer")
+    @sale_ns.expect(transition_parser)
+    @sale_ns.response(int(HTTPStatus.OK), "transitions applied")
+    @sale_ns.response(int(HTTPStatus.BAD_REQUEST), "Validation error.")
+    @sale_ns.response(int(HTTPStatus.INTERNAL_SERVER_ERROR), "Internal server error.")
+    def post(self):
+        """Apply order transitions in order
+
+        Demo pass values
+        {
+        "transitions": [
+            {"order_id": 1, "action": "accept", "client_ts": "2022-07-01T10:15:00"},
+            {"order_id": 1, "action": "pickup", "client_ts": "2022-07-01T10:30:00"}
+        ]
+        }
+
+        Intended Result
+        [
+            {order_id, action, client_ts, status:success/fail, message:accept/picked/delivered or error}
+        ]
+        """
+        data = transition_parser.parse_args()
+        res = create_order_transitions(data)
+        return res
+
+
 # order seller details
 @sale_ns.route("/order/list", endpoint="order_list")
 class OrderList(Resource):
     """Handles HTTP requests to URL: /api/v1/sale/order/list"""
 
     @sale_ns.doc(security="Bearer")
+    @sale_ns.expect(order_list_parser)
     @sale_ns.response(int(HTTPStatus.OK), "Query Run Successfully")
+    @sale_ns.response(int(HTTPStatus.BAD_REQUEST), "Validation error.")
     @sale_ns.response(int(HTTPStatus.INTERNAL_SERVER_ERROR), "Internal server error")
     def get(self):
-        """get all orders"""
-        res = get_order_list()
+        """get orders page by page
+
+        Last item of the list holds next_cursor, pass it as cursor to get
+        the next page. next_cursor is null on the last page.
+        First page also holds sync_token, pass it as since to get only the
+        orders changed after it along with removed order ids and a new sync_token.
+        Open orders carry pickup_eta and drop_eta in UTC, null once delivered.
+        """
+        data = order_list_parser.parse_args()
+        res = get_order_list(data)
+        return res
+
+
+# dispatch unassigned orders now
+@sale_ns.route("/order/dispatch", endpoint="dispatch_orders")
+class DispatchOrders(Resource):
+    """Handles HTTP requests to URL: /api/v1/sale/order/dispatch"""
+
+    @sale_ns.doc(security="Bearer")
+    @sale_ns.response(int(HTTPStatus.ACCEPTED), "Dispatch queued")
+    @sale_ns.response(int(HTTPStatus.TOO_MANY_REQUESTS), "Dispatch already requested")
+    @sale_ns.response(int(HTTPStatus.INTERNAL_SERVER_ERROR), "Internal server error")
+    def post(self):
+        """queue matching of unassigned orders to online deliverers
+
+        Same batch as the periodic dispatch, run on a worker at most
+        once per DISPATCH_REQUEST_INTERVAL seconds. Every online deliverer
+        may get orders and is notified with order_assigned events.
+        Needs REDIS_URL so the worker sees deliverer positions, it is
+        skipped otherwise.
+
+        Intended Result
+        {
+            status:success,
+            message:dispatch_queued
+        }
+        """
+        res = create_dispatch()
         return res
 
 
+@sale_ns.route("/order/nearby", endpoint="nearby_orders")
+class NearbyOrders(Resource):
+    """Handles HTTP requests to URL: /api/v1/sale/order/nearby"""
+
+    @sale_ns.doc(security="Bearer")
+    @sale_ns.expect(nearby_parser)
+    @sale_ns.response(int(HTTPStatus.OK), "Query Run Successfully")
+    @sale_ns.response(int(HTTPStatus.BAD_REQUEST), "Validation error.")
+    @sale_ns.response(int(HTTPStatus.INTERNAL_SERVER_ERROR), "Internal server error")
+    def get(self):
+        """get unassigned orders picked up within MAX_DISTANCE km, nearest first
+
+        Sellers are prefiltered on the seller_profile geocell index, the
+        exact distance from the deliverer to the seller decides.
+        """
+        data = nearby_parser.parse_args()
+        res = get_nearby_orders(data)
+        return res
+
+
+# picked orders in visiting order
+@sale_ns.route("/order/route", endpoint="order_route")
+class OrderRoute(Resource):
+    """Handles HTTP requests to URL: /api/v1/sale/order/route"""
+
+    @sale_ns.doc(security="Bearer")
+    @sale_ns.expect(route_parser)
+    @sale_ns.response(int(HTTPStatus.OK), "Query Run Successfully")
+    @sale_ns.response(int(HTTPStatus.BAD_REQUEST), "Validation error.")
+    @sale_ns.response(int(HTTPStatus.INTERNAL_SERVER_ERROR), "Internal server error")
+    def get(self):
+        """get picked orders in the order to deliver them
+
+        Route starts at the given deliverer location.
+        Last item of the list holds the total route distance in km.
+        """
+        data = route_parser.parse_args()
+        res = get_order_route(data)
+        return res
+
+
+# order changes pushed to deliverer
+@sale_ns.route("/events", endpoint="sale_events")
+class SaleEvents(Resource):
+    """Handles HTTP requests to URL: /api/v1/sale/events"""
+
+    @sale_ns.doc(security="Bearer")
+    @sale_ns.doc(params={"Last-Event-ID": {"in": "header", "description": "Resume after this event id"}})
+    @sale_ns.response(int(HTTPStatus.OK), "text/event-stream of order events")
+    def get(self):
+        """Server sent event stream of order changes
+
+        Events: order_assigned, order_picked, order_delivered, data is {order_id}.
+        A heartbeat comment is sent every EVENT_HEARTBEAT seconds without events.
+        """
+        return get_event_stream(request.headers.get("Last-Event-ID"))
+
+
 ########################################### return ###########################################
 
 # order accept
@@ -177,11 +315,20 @@ class ReturnList(Resource):
     """Handles HTTP requests to URL: /api/v1/sale/return/list"""
 
     @sale_ns.doc(security="Bearer")
+    @sale_ns.expect(return_list_parser)
     @sale_ns.response(int(HTTPStatus.OK), "Query Run Successfully")
+    @sale_ns.response(int(HTTPStatus.BAD_REQUEST), "Validation error.")
     @sale_ns.response(int(HTTPStatus.INTERNAL_SERVER_ERROR), "Internal server error")
     def get(self):
-        """get all return orders"""
-        res = get_return_list()
+        """get return orders page by page
+
+        Last item of the list holds next_cursor, pass it as cursor to get
+        the next page. next_cursor is null on the last page.
+        First page also holds sync_token, pass it as since to get only the
+        returns changed after it along with removed return ids.
+        """
+        data = return_list_parser.parse_args()
+        res = get_return_list(data)
         return res
 
 
@@ -1,19 +1,32 @@
 from http import HTTPStatus
-from datetime import datetime
+from datetime import datetime, timedelta
 
 
 
-from flask import current_app, jsonify
-from application import db
+import json
 
-from .utils import gen_ref_key
+from flask import Response, current_app, jsonify, stream_with_context
+from flask_restx.inputs import datetime_from_iso8601
+from sqlalchemy import and_, or_, func
+from application import cache, db, events
+
+from .utils import (
+    deliverer_channel,
+    publish_order_event,
+    apply_transition,
+    dispatch_orders_task,
+    record_prep_time,
+    record_delivery_speed,
+    order_etas,
+    transition_time,
+)
 from application.models import (
     OrderMobile,
+    OrderMobileRelease,
     Order,
     SellerProfile,
     CustomerUser,
     CustomerProfile,
-    SellerUser,
     OrderGrocery,
     GroceryProduct,
     OrderFood,
@@ -24,7 +37,6 @@ from application.models import (
     OrderReturnGrocery,
     OrderPaymentDetails,
     OrderPayment,
-    DeliveryPayment,
     DeliveryPaymentCashInHand,
     
 
@@ -33,25 +45,30 @@ from application.models import (
 
 
 from application.helpers import token_required
+from application.api.finance.utils import add_balance
+from application.util.cursor import encode_cursor, decode_cursor
+from application.util.result import Result
+from application.util.order_state import (
+    PICKED,
+    DELIVERED,
+    CANCELLED,
+    STATE_NAMES,
+    state_name,
+)
+from application.util.calc import gc_distances, gc_distance_matrix
+from application.util.route import plan_route
+from application.util import geohash
+
 
 
 @token_required
 def create_accept_order(data):
     try:
-        res={}
-        ord_id=data.get("order_id")
-        order_m=db.session.query(OrderMobile).filter_by(order_id=ord_id).first()
-        print(order_m)
-        deliverer_id=create_accept_order.user_id
-        order_m.deliverer_id=deliverer_id
-        db.session.commit()
-
-
-        res = jsonify(
-            status="success",
-            message="accept",
-        )
+        ord_id = data.get("order_id")
+        result = _accept_order(ord_id, create_accept_order.user_id)
+        res = _transition_response(result, create_accept_order.user_id, ord_id)
     except Exception as e:
+        db.session.rollback()
         res = jsonify(status="fail", message=str(e))
         res.status_code = HTTPStatus.INTERNAL_SERVER_ERROR
     return res
@@ -61,180 +78,254 @@ def create_accept_order(data):
 @token_required
 def create_pickup_order(data):
     try:
-        ord_id=data.get("order_id")
-        res = {}
-        order_m = db.session.query(OrderMobile).filter_by(order_id=ord_id).first()
-        print(order_m)
-        order_m.is_pick = True
+        ord_id = data.get("order_id")
+        result = _pickup_order(ord_id, create_pickup_order.user_id)
+        res = _transition_response(result, create_pickup_order.user_id, ord_id)
+    except Exception as e:
+        db.session.rollback()
+        res = jsonify(status="fail", message=str(e))
+        res.status_code = HTTPStatus.INTERNAL_SERVER_ERROR
+    return res
+
+
+# Apply ordered accept, pickup and deliver actions in one transaction
+# Each item runs in a savepoint, a failed item does not undo the others
+# client_ts of an item is when the action happened on the device
+@token_required
+def create_order_transitions(data):
+    try:
+        deliverer_id = create_order_transitions.user_id
+        transitions = data.get("transitions")
+        if len(transitions) > current_app.config.get("TRANSITION_BATCH_LENGTH"):
+            raise ValueError("too_many_transitions")
+        res = []
+
+        for item in transitions:
+            if not isinstance(item, dict):
+                res.append({"status": "fail", "message": "invalid_transition"})
+                continue
+            info = {
+                "order_id": item.get("order_id"),
+                "action": item.get("action"),
+                "client_ts": item.get("client_ts"),
+            }
+            action = _TRANSITION_ACTIONS.get(item.get("action"))
+            if not action or not isinstance(item.get("order_id"), int):
+                info.update(status="fail", message="invalid_transition")
+                res.append(info)
+                continue
+            try:
+                client_ts = item.get("client_ts") and datetime_from_iso8601(item["client_ts"])
+            except (TypeError, ValueError):
+                info.update(status="fail", message="invalid_client_ts")
+                res.append(info)
+                continue
+
+            savepoint = db.session.begin_nested()
+            try:
+                at = transition_time(item.get("order_id"), client_ts) if client_ts else None
+                result = action(item.get("order_id"), deliverer_id, at)
+            except Exception as e:
+                result = Result.Fail(str(e))
+            if result.success:
+                savepoint.commit()
+                info.update(status="success", message=result.value)
+            else:
+                savepoint.rollback()
+                info.update(status="fail", message=result.error)
+            res.append(info)
+
         db.session.commit()
-        
 
-        res = jsonify(
-            status="success",
-            message="picked",
-        )
+        for info in res:
+            if info["status"] == "success":
+                publish_order_event(deliverer_id, _TRANSITION_EVENTS[info["message"]], info["order_id"])
 
+        res = jsonify(res)
+        res.status_code = HTTPStatus.OK
+    except ValueError as e:
+        res = jsonify(status="fail", message=str(e))
+        res.status_code = HTTPStatus.BAD_REQUEST
     except Exception as e:
+        db.session.rollback()
         res = jsonify(status="fail", message=str(e))
         res.status_code = HTTPStatus.INTERNAL_SERVER_ERROR
     return res
 
 
+# Assign order to deliverer
+# Claim with one conditional update, only a single deliverer can win the order
+def _accept_order(ord_id, deliverer_id, at=None):
+    if apply_transition(OrderMobile, ord_id, deliverer_id, "accept", at):
+        return Result.Ok("accept")
+
+    # Lost claim, tell why
+    order_m = (
+        db.session.query(OrderMobile.deliverer_id).filter_by(order_id=ord_id).first()
+    )
+    if not order_m:
+        return Result.Fail("order_not_found")
+    if order_m.deliverer_id == deliverer_id:
+        return Result.Ok("accept")
+    return Result.Fail("already_taken")
+
+
+# Mark order of deliverer as picked
+def _pickup_order(ord_id, deliverer_id, at=None):
+    if apply_transition(OrderMobile, ord_id, deliverer_id, "pickup", at):
+        record_prep_time(ord_id)
+        return Result.Ok("picked")
+    return _transition_failure(OrderMobile, ord_id, deliverer_id, PICKED, "picked")
+
+
+# Mark order of deliverer as delivered
+# Collect COD amount to cash in hand
+def _deliver_order(ord_id, deliverer_id, at=None):
+    if not apply_transition(OrderMobile, ord_id, deliverer_id, "deliver", at):
+        return _transition_failure(OrderMobile, ord_id, deliverer_id, DELIVERED)
+    record_delivery_speed(ord_id, deliverer_id, at)
+
+    order_payment_q=(
+        db.session.query(
+            OrderPayment.id.label('pay_id'),Order.id.label('order_id'),Order.net)
+            .join(OrderPayment,OrderPayment.order_id==Order.id)
+            .filter(Order.id==ord_id).subquery()
+    )
+
+    order_pay_details_q=(
+        db.session.query(
+            OrderPaymentDetails.method,order_payment_q.c.pay_id,order_payment_q.c.order_id,order_payment_q.c.net)
+            .join(order_payment_q,order_payment_q.c.pay_id == OrderPaymentDetails.pay_id)
+            .first()
+    )
+
+    if order_pay_details_q and order_pay_details_q.method == current_app.config.get("PAYMENT_METHODS")["COD"]:
+
+        #Cash in hand
+        delivery_pay = add_balance(
+            deliverer_id, "cod", order_id=ord_id, cash_in_hand=order_pay_details_q.net
+        )
+
+        #add to DeliveryPaymentCashInHand
+        new_deliver_payment_cih=DeliveryPaymentCashInHand(pay_id=delivery_pay.id,order_id=ord_id)
+        db.session.add(new_deliver_payment_cih)
+
+    db.session.flush()
+    return Result.Ok("delivered")
+
+
+# Tell why a transition did not apply
+# Repeating the action that led to repeat_state succeeds again
+def _transition_failure(model, ord_id, deliverer_id, state, repeat_message=None):
+    row = (
+        db.session.query(model.state)
+        .filter_by(order_id=ord_id, deliverer_id=deliverer_id)
+        .first()
+    )
+    if not row:
+        return Result.Fail("order_not_found")
+    if row.state == state and repeat_message:
+        return Result.Ok(repeat_message)
+    if state == DELIVERED and row.state in STATE_NAMES["delivered"]:
+        return Result.Fail("already_delivered")
+    return Result.Fail("invalid_state")
+
+
+# Transition actions by name
+_TRANSITION_ACTIONS = {
+    "accept": _accept_order,
+    "pickup": _pickup_order,
+    "deliver": _deliver_order,
+}
+
+# Response status of failed transitions
+_TRANSITION_ERROR_STATUS = {
+    "order_not_found": HTTPStatus.NOT_FOUND,
+    "already_delivered": HTTPStatus.CONFLICT,
+    "already_taken": HTTPStatus.CONFLICT,
+    "invalid_state": HTTPStatus.CONFLICT,
+}
+
+
+# Event published for each successful transition
+_TRANSITION_EVENTS = {
+    "accept": "order_assigned",
+    "picked": "order_picked",
+    "delivered": "order_delivered",
+}
+
+
+# Commit successful transition or rollback failed one
+def _transition_response(result, deliverer_id, ord_id):
+    if result.failure:
+        db.session.rollback()
+        res = jsonify(status="fail", message=result.error)
+        res.status_code = _TRANSITION_ERROR_STATUS.get(result.error, HTTPStatus.BAD_REQUEST)
+        return res
+    db.session.commit()
+    publish_order_event(deliverer_id, _TRANSITION_EVENTS[result.value], ord_id)
+    return jsonify(status="success", message=result.value)
 
 
 @token_required
 def get_order_details(order_id):
     try:
         res = []
-        res2 = {}
         deliver_id = get_order_details.user_id
-        #print(deliver_id)
 
-        # order details
+        # order, customer and seller details in one statement
         order_q = (
             db.session.query(
                 Order.id.label("order_id"),
                 Order.ref_no,
-                Order.seller_prof,
                 Order.type,
                 Order.date,
                 Order.net,
-                OrderMobile.is_pick,
-                OrderMobile.is_deliver,
+                OrderMobile.state,
                 OrderMobile.latitude,
                 OrderMobile.longitude,
-                OrderMobile.cus_id,
+                CustomerUser.contact_no.label("cus_contact_no"),
+                CustomerProfile.ref_no.label("cus_ref_no"),
+                SellerProfile.contact_no.label("seller_contact_no"),
+                SellerProfile.ref_no.label("seller_ref_no"),
             )
             .join(OrderMobile, OrderMobile.order_id == Order.id)
-            .filter(Order.id == order_id, OrderMobile.deliverer_id == deliver_id)
-            .first()
-        )
-        print(order_q.is_pick)
-
-       
-    
-        # order State
-        is_pick= order_q.is_pick           
-        is_deliver = order_q.is_deliver
-        
-        
-        
-        if is_pick == True and is_deliver==False:
-            state = "picked"
-        elif is_pick == True and is_deliver == True:
-            state = "delivered"
-        else:
-            state = "pending"
-        
-
-
-        # get customer details
-        cus_q = (
-            db.session.query(
-                CustomerUser.id.label("cus_id"),
-                CustomerUser.contact_no,
-                CustomerProfile.ref_no,
-                OrderMobile.order_id,
-            )
-            .join(OrderMobile, OrderMobile.cus_id == CustomerUser.id)
+            .join(CustomerUser, CustomerUser.id == OrderMobile.cus_id)
             .join(CustomerProfile, CustomerProfile.cus_id == CustomerUser.id)
-            .filter(CustomerUser.id == order_q.cus_id)
+            .join(SellerProfile, SellerProfile.id == Order.seller_prof)
+            .filter(Order.id == order_id, OrderMobile.deliverer_id == deliver_id)
             .first()
         )
 
-        #print(cus_q)
+        if not order_q:
+            res = jsonify(status="fail", message="order_not_found")
+            res.status_code = HTTPStatus.NOT_FOUND
+            return res
 
-        # seller details
-        seller_q = (
-            db.session.query(
-                SellerUser.id.label("seller_id"),
-                SellerProfile.first_name,
-                SellerProfile.contact_no,
-                SellerProfile.organization,
-                SellerProfile.ref_no,
-                Order.id,
-            )
-            .join(SellerProfile, SellerProfile.seller_id == SellerUser.id)
-            .join(Order,Order.seller_prof==SellerProfile.seller_id)
-            .filter(SellerProfile.id == order_q.seller_prof)
-            .first()
-        )
-        #print(seller_q)
+        # order State
+        state = state_name(order_q.state)
 
         if order_q.type == "g":
-            # get order_grocery details
-            order_grocery = (
-                db.session.query(
-                    OrderGrocery.qty,
-                    OrderGrocery.total,
-                    OrderGrocery.product_id,
-                    GroceryProduct.name,
-                )
-                .join(GroceryProduct, GroceryProduct.id == OrderGrocery.product_id)
-                .filter(OrderGrocery.order_id == order_id)
-                .all()
-            )
-
-            for i in order_grocery:
-
-                info = {"product_name": i.name, "qty": i.qty, "Total": i.total}
-                res.append(info)
-
+            res = _order_grocery_items(order_id)
         elif order_q.type == "f":
-            # get order_food details
-            order_Food = (
-                db.session.query(
-                    OrderFood.id,
-                    OrderFood.qty,
-                    OrderFood.total,
-                    OrderFood.food_id,
-                    Food.name,
-                )
-                .join(Food, Food.id == OrderFood.food_id)
-                .filter(OrderFood.order_id == order_id)
-                .all()
-            )
-
-            for i in order_Food:
-                info = {"food_name": i.name, "qty": i.qty, "Total": i.total}
-                res.append(info)      
-                print(i.id)
-
-
-                order_Food_tax = (
-                    db.session.query(
-                        OrderFoodTaxonomy.taxonomy,
-                        OrderFoodTaxonomy.content,
-                        FoodTaxonomy.description,
-                        OrderFoodTaxonomy.food_order_id
-                    )
-                    .join(FoodTaxonomy, FoodTaxonomy.term_id == OrderFoodTaxonomy.term_id)
-                    .filter(
-                        OrderFoodTaxonomy.food_order_id == i.id,
-                        OrderFoodTaxonomy.taxonomy == "addon",
-                    )
-                    .all()
-                )
-
-            for i in order_Food_tax:
-                    info2 = {"addon_price": i.content["price"], "addon_qty": i.content["qty"]}
-                    res.append(info2)
-
-           
+            res = _order_food_items(order_id)
 
         res2 = {
             "net_price": order_q.net,
             "state": state,
-            "order_id":order_q.order_id,
-            "Order_ref_no":order_q.ref_no,
+            "order_id": order_q.order_id,
+            "Order_ref_no": order_q.ref_no,
             "order_date": order_q.date.strftime("%y-%m-%d"),
             "order_longitude": order_q.longitude,
             "order_latitude": order_q.latitude,
-            "Customer_ref_no": cus_q.ref_no,
-            "Customer_contact_no": cus_q.contact_no,
-            "Sellet_contact_no": seller_q.contact_no,
-            "seller_ref": seller_q.ref_no,
+            "Customer_ref_no": order_q.cus_ref_no,
+            "Customer_contact_no": order_q.cus_contact_no,
+            "Sellet_contact_no": order_q.seller_contact_no,
+            "seller_ref": order_q.seller_ref_no,
         }
+        eta = order_etas(deliver_id, [(order_q.order_id, order_q.state)]).get(order_q.order_id, {})
+        res2["pickup_eta"] = eta.get("pickup_eta")
+        res2["drop_eta"] = eta.get("drop_eta")
 
         res.append(res2)
         res = jsonify(res)
@@ -246,129 +337,146 @@ def get_order_details(order_id):
     return res
 
 
-@token_required
-def create_order_deliver(data):
-    try:
-        deliver_id=create_order_deliver.user_id
-        ord_id = data.get("order_id")
-        res = {}
-        order_m = db.session.query(OrderMobile).filter_by(order_id=ord_id).first()
-        order_m.is_deliver = True
-
-        order_payment_q=(
-            db.session.query(
-                OrderPayment.id.label('pay_id'),Order.id.label('order_id'),Order.net)
-                .join(OrderPayment,OrderPayment.order_id==Order.id)
-                .filter(Order.id==ord_id).subquery()
+# Grocery line items of an order
+def _order_grocery_items(order_id):
+    order_grocery = (
+        db.session.query(
+            OrderGrocery.qty,
+            OrderGrocery.total,
+            GroceryProduct.name,
         )
-        
-        order_pay_details_q=(
-            db.session.query(
-                OrderPaymentDetails.method,order_payment_q.c.pay_id,order_payment_q.c.order_id,order_payment_q.c.net)
-                .join(order_payment_q,order_payment_q.c.pay_id == OrderPaymentDetails.pay_id)
-                .first()
+        .join(GroceryProduct, GroceryProduct.id == OrderGrocery.product_id)
+        .filter(OrderGrocery.order_id == order_id)
+        .all()
+    )
+    return [{"product_name": i.name, "qty": i.qty, "Total": i.total} for i in order_grocery]
+
+
+# Food line items of an order with their addons
+# Addons of all lines are fetched in one query keyed by food_order_id
+def _order_food_items(order_id):
+    order_food = (
+        db.session.query(
+            OrderFood.id,
+            OrderFood.qty,
+            OrderFood.total,
+            Food.name,
+        )
+        .join(Food, Food.id == OrderFood.food_id)
+        .filter(OrderFood.order_id == order_id)
+        .all()
+    )
+    if not order_food:
+        return []
+
+    addons = {}
+    order_food_tax = (
+        db.session.query(
+            OrderFoodTaxonomy.food_order_id,
+            OrderFoodTaxonomy.content,
+            FoodTaxonomy.description,
+        )
+        .join(FoodTaxonomy, FoodTaxonomy.term_id == OrderFoodTaxonomy.term_id)
+        .filter(
+            OrderFoodTaxonomy.food_order_id.in_([i.id for i in order_food]),
+            OrderFoodTaxonomy.taxonomy == "addon",
+        )
+        .all()
+    )
+    for i in order_food_tax:
+        addons.setdefault(i.food_order_id, []).append(
+            {
+                "addon_name": i.description,
+                "addon_price": i.content["price"],
+                "addon_qty": i.content["qty"],
+            }
         )
 
-        if order_pay_details_q.method == current_app.config.get("PAYMENT_METHODS")["COD"]:
-            
-            #Cash in hand
-            delivery_pay=db.session.query(DeliveryPayment).filter_by(deliverer_id=deliver_id).first()
-            delivery_pay_id=0
-
-            if delivery_pay:
-                delivery_pay_id=delivery_pay.id
-                cash=delivery_pay.cash_in_hand
-                delivery_pay.cash_in_hand = cash + order_pay_details_q.net
-                db.session.flush()
-                
-
-            else:
-                cash=float(order_pay_details_q.net)
-                delivery_payment=DeliveryPayment(cash_in_hand=cash,deliverer_id=deliver_id)
-                db.session.add(delivery_payment)
-                db.session.flush()
-                delivery_pay_id=delivery_payment.id
-                               
-
-            #add to DeliveryPaymentCashInHand
-            new_deliver_payment_cih=DeliveryPaymentCashInHand(pay_id=delivery_pay_id,order_id=ord_id)
-            db.session.add(new_deliver_payment_cih)
-                
-            print(new_deliver_payment_cih.id)            
-            db.session.commit()
-
-        
+    return [
+        {
+            "food_name": i.name,
+            "qty": i.qty,
+            "Total": i.total,
+            "addons": addons.get(i.id, []),
+        }
+        for i in order_food
+    ]
 
-        res = jsonify(
-            status="success",
-            message="delivered",
-        )
 
+@token_required
+def create_order_deliver(data):
+    try:
+        ord_id = data.get("order_id")
+        result = _deliver_order(ord_id, create_order_deliver.user_id)
+        res = _transition_response(result, create_order_deliver.user_id, ord_id)
     except Exception as e:
+        db.session.rollback()
         res = jsonify(status="fail", message=str(e))
         res.status_code = HTTPStatus.INTERNAL_SERVER_ERROR
     return res
 
+
 @token_required
-def get_order_list():
+def get_order_list(data):
     try:
         deliverer_id = get_order_list.user_id
+        if data.get("since"):
+            return _get_order_changes(deliverer_id, data.get("since"))
+
+        cursor = data.get("cursor")
+        state_filter = data.get("state")
+        limit = current_app.config.get("DISPLAY_LIST_LENGTH")
         res = []
-        state=''
+        # Taken before the list so rows changed meanwhile are sent by delta sync
+        sync_ts = None if cursor else _sync_time()
         orders = (
             db.session.query(
                 Order.id,
-                Order.type,
-                Order.is_complete,
-                Order.is_cancel,
-                Order.seller_prof,
                 Order.date,
                 Order.net,
-                OrderMobile.is_accept,
                 OrderMobile.cus_id,
-                OrderMobile.is_pick,
-                OrderMobile.is_recive,
-                OrderMobile.is_ready,
-                OrderMobile.is_deliver,
+                OrderMobile.state,
                 SellerProfile.organization,
                 SellerProfile.street_address,
             )
             .join(SellerProfile, SellerProfile.id == Order.seller_prof)
             .join(OrderMobile, OrderMobile.order_id == Order.id)
             .filter(OrderMobile.deliverer_id == deliverer_id)
-            .all()
         )
+        if state_filter:
+            orders = orders.filter(OrderMobile.state.in_(STATE_NAMES[state_filter]))
+        if cursor:
+            # Keyset on (date, id), newest first
+            last_date, last_id = decode_cursor(cursor, datetime, int)
+            orders = orders.filter(
+                or_(
+                    Order.date < last_date,
+                    and_(Order.date == last_date, Order.id < last_id),
+                )
+            )
+        # Fetch one extra row to know whether there is a next page
+        orders = orders.order_by(Order.date.desc(), Order.id.desc()).limit(limit + 1).all()
 
-        # print(orders)
-        for i in orders:
-
-            # order State
-          
-            is_deliver = i.is_deliver
-            is_pick = i.is_pick         
-            
-           
-            if is_pick == True and is_deliver==False:
-                state = "picked"
-            elif is_pick == True and is_deliver == True:
-                state = "delivered"
-            else:
-                state = "pending"
+        next_cursor = None
+        if len(orders) > limit:
+            orders = orders[:limit]
+            next_cursor = encode_cursor(orders[-1].date, orders[-1].id)
 
-            info = {
-                "order_id": i.id,
-                "state": state,
-                "seller_name": i.organization,
-                "street_address": i.street_address,
-                "Order_date": i.date.strftime("%y-%m-%d"),
-                "net": i.net,
-                "cus_id":i.cus_id
+        etas = order_etas(deliverer_id, [(i.id, i.state) for i in orders])
+        for i in orders:
+            res.append(_order_list_item(i, etas.get(i.id)))
 
-            }
-            res.append(info)
+        info = {"next_cursor": next_cursor}
+        if sync_ts:
+            # Starting point for delta sync with since
+            info["sync_token"] = encode_cursor(sync_ts)
+        res.append(info)
 
         res = jsonify(res)
         res.status_code = HTTPStatus.CREATED
+    except ValueError as e:
+        res = jsonify(status="fail", message=str(e))
+        res.status_code = HTTPStatus.BAD_REQUEST
     except Exception as e:
         res = jsonify(status="fail", message=str(e))
         res.status_code = HTTPStatus.INTERNAL_SERVER_ERROR
@@ -376,6 +484,94 @@ def get_order_list():
     return res
 
 
+# Server time a sync token starts from, set back by SYNC_TOKEN_OVERLAP
+# so changes of transactions still in flight are not skipped
+def _sync_time():
+    now = db.session.query(func.now()).scalar()
+    return now - timedelta(seconds=current_app.config.get("SYNC_TOKEN_OVERLAP"))
+
+
+# Orders of deliverer changed since the sync token
+# Rejected, cancelled and reassigned orders are returned as removed order ids
+def _get_order_changes(deliverer_id, since):
+    since_ts, = decode_cursor(since, datetime)
+    sync_ts = max(since_ts, _sync_time())
+    res = []
+    removed = []
+
+    # Compare with >= since timestamps have second precision,
+    # rows of the boundary second are sent again
+    orders = (
+        db.session.query(
+            Order.id,
+            Order.date,
+            Order.net,
+            Order.is_cancel,
+            OrderMobile.cus_id,
+            OrderMobile.state,
+            OrderMobile.is_reject,
+            OrderMobile.timestamp,
+            SellerProfile.organization,
+            SellerProfile.street_address,
+        )
+        .join(SellerProfile, SellerProfile.id == Order.seller_prof)
+        .join(OrderMobile, OrderMobile.order_id == Order.id)
+        .filter(
+            OrderMobile.deliverer_id == deliverer_id,
+            OrderMobile.timestamp >= since_ts,
+        )
+        .all()
+    )
+
+    etas = order_etas(deliverer_id, [(i.id, i.state) for i in orders])
+    for i in orders:
+        if i.is_cancel or i.is_reject or i.state == CANCELLED:
+            removed.append(i.id)
+        else:
+            res.append(_order_list_item(i, etas.get(i.id)))
+
+    # Orders taken away from the deliverer and not assigned back since
+    released = (
+        db.session.query(OrderMobileRelease.order_id)
+        .outerjoin(
+            OrderMobile,
+            and_(
+                OrderMobile.order_id == OrderMobileRelease.order_id,
+                OrderMobile.deliverer_id == deliverer_id,
+            ),
+        )
+        .filter(
+            OrderMobileRelease.deliverer_id == deliverer_id,
+            OrderMobileRelease.timestamp >= since_ts,
+            OrderMobile.id.is_(None),
+        )
+        .distinct()
+        .all()
+    )
+    removed.extend(i.order_id for i in released if i.order_id not in removed)
+
+    res.append({"removed": removed, "sync_token": encode_cursor(sync_ts)})
+    res = jsonify(res)
+    res.status_code = HTTPStatus.OK
+    return res
+
+
+# Order list row to response item
+# ETA of delivered orders is null
+def _order_list_item(i, eta=None):
+    eta = eta or {}
+    return {
+        "order_id": i.id,
+        "state": state_name(i.state),
+        "seller_name": i.organization,
+        "street_address": i.street_address,
+        "Order_date": i.date.strftime("%y-%m-%d"),
+        "net": i.net,
+        "cus_id": i.cus_id,
+        "pickup_eta": eta.get("pickup_eta"),
+        "drop_eta": eta.get("drop_eta"),
+    }
+
 
 
 ## return
@@ -386,12 +582,17 @@ def create_return_order():
 def create_pickup_return(data):
     try:
         ord_id=data.get("order_id")
-        res = {}
-        order_r = db.session.query(OrderReturn).filter_by(order_id=ord_id).first()
-        print(order_r)
-        order_r.is_pick = True
+        deliverer_id = create_pickup_return.user_id
+        if apply_transition(OrderReturn, ord_id, deliverer_id, "pickup"):
+            result = Result.Ok("picked")
+        else:
+            result = _transition_failure(OrderReturn, ord_id, deliverer_id, PICKED, "picked")
+        if result.failure:
+            db.session.rollback()
+            res = jsonify(status="fail", message=result.error)
+            res.status_code = _TRANSITION_ERROR_STATUS.get(result.error, HTTPStatus.BAD_REQUEST)
+            return res
         db.session.commit()
-        
 
         res = jsonify(
             status="success",
@@ -413,116 +614,70 @@ def get_return_details(ord_id):
 
         deliverer_id = get_return_details.user_id
         res = []
-        # roduct_details=0
-        state = ""       
 
-        return_orders = (
+        # return, customer and seller details in one statement
+        i = (
             db.session.query(
                 OrderReturn.id.label('return_id'),
                 OrderReturn.ref_no,
                 OrderReturn.date,
-                OrderReturn.note,                
-                OrderReturn.is_pick,
-                OrderReturn.is_deliver,
+                OrderReturn.note,
+                OrderReturn.state,
                 OrderReturn.order_id,
-                OrderMobile.order_id,
-                Order.id.label('order_id'),
-                OrderMobile.cus_id,
-                Order.seller_prof,                
+                CustomerUser.contact_no.label("cus_contact_no"),
+                CustomerProfile.ref_no.label("cus_ref_no"),
+                SellerProfile.contact_no.label("seller_contact_no"),
+                SellerProfile.ref_no.label("seller_ref_no"),
             )
-            #.join(Order,Order.id == OrderMobile.order_id)
-            .join(Order,OrderReturn.order_id == Order.id)
-            .join(OrderMobile,OrderMobile.order_id == Order.id)                      
+            .join(Order, OrderReturn.order_id == Order.id)
+            .join(OrderMobile, OrderMobile.order_id == Order.id)
+            .join(CustomerUser, CustomerUser.id == OrderMobile.cus_id)
+            .join(CustomerProfile, CustomerProfile.cus_id == CustomerUser.id)
+            .join(SellerProfile, SellerProfile.id == Order.seller_prof)
             .filter(OrderReturn.deliverer_id == deliverer_id, OrderReturn.order_id == ord_id)
             .first()
         )
-        print(return_orders.return_id)     
-
 
+        if not i:
+            res = jsonify(status="fail", message="return_not_found")
+            res.status_code = HTTPStatus.NOT_FOUND
+            return res
+
+        info = {
+            "return_id": i.return_id,
+            "order_id": i.order_id,
+            "ref_no": i.ref_no,
+            "date": i.date.strftime("%y-%m-%d"),
+            "state": state_name(i.state),
+            "note": i.note,
+            "Customer_ref_no": i.cus_ref_no,
+            "Customer_contact_no": i.cus_contact_no,
+            "seller_ref": i.seller_ref_no,
+            "Sellet_contact_no": i.seller_contact_no,
+        }
+        res.append(info)
 
-        # get customer details
-        cus_q = (
+        product_details = (
             db.session.query(
-                CustomerUser.id.label("cus_id"),
-                CustomerUser.contact_no,
-                CustomerProfile.ref_no,
-                OrderMobile.order_id,
+                OrderReturnGrocery.grocery_order_id,
+                OrderReturnGrocery.qty,
+                GroceryProduct.name,
             )
-            .join(OrderMobile, OrderMobile.cus_id == CustomerUser.id)
-            .join(CustomerProfile, CustomerProfile.cus_id == CustomerUser.id)
-            .filter(CustomerUser.id == return_orders.cus_id)
-            .first()
-        )
-
-        print(cus_q)
-
-        # seller details
-        seller_q = (
-            db.session.query(
-                SellerUser.id.label("seller_id"),
-                SellerProfile.first_name,
-                SellerProfile.contact_no,
-                SellerProfile.organization,
-                SellerProfile.ref_no,
-                Order.id,
+            .join(
+                OrderGrocery, OrderGrocery.id == OrderReturnGrocery.grocery_order_id
             )
-            .join(SellerProfile, SellerProfile.seller_id == SellerUser.id)
-            .join(Order,Order.seller_prof==SellerProfile.seller_id)
-            .filter(SellerProfile.id == return_orders.seller_prof)
-            .first()
+            .join(GroceryProduct, GroceryProduct.id == OrderGrocery.product_id)
+            .filter(OrderReturnGrocery.return_id == i.return_id)
+            .all()
         )
 
-        
-        if return_orders:
-                    # order State
-            i=return_orders
-            is_pick= i.is_pick           
-            is_deliver = i.is_deliver
-            if is_pick == True and is_deliver==False:
-                state = "picked"
-            elif is_deliver == True:
-                state = "delivered"
-            else:
-                state = "pending"
-
-            info = {
-                "return_id": i.return_id,
-                "order_id":i.order_id,
-                "ref_no": i.ref_no,
-                "date": i.date.strftime("%y-%m-%d"),
-                "state": state,
-                "note": i.note,
-                "Customer_ref_no": cus_q.ref_no,
-                "Customer_contact_no": cus_q.contact_no,
-                "seller_ref": seller_q.ref_no,
-                "Sellet_contact_no": seller_q.contact_no,
-                
+        for x in product_details:
+            info2 = {
+                "grocery_order_id": x.grocery_order_id,
+                "qty": x.qty,
+                "product_name": x.name,
             }
-            
-            res.append(info)
-
-            product_details = (
-                db.session.query(
-                    OrderReturnGrocery.grocery_order_id,
-                    OrderReturnGrocery.qty,
-                    GroceryProduct.name,
-                )
-                .join(
-                    OrderGrocery, OrderGrocery.id == OrderReturnGrocery.grocery_order_id
-                )
-                .join(GroceryProduct, GroceryProduct.id == OrderGrocery.product_id)
-                .filter(OrderReturnGrocery.return_id == i.return_id)
-                .all()
-            )
-            print(product_details)
-            
-            for x in product_details:
-                info2 = {
-                    "grocery_order_id": x.grocery_order_id,
-                    "qty": x.qty,
-                    "product_name": x.name,
-                }
-                res.append(info2)
+            res.append(info2)
         res = jsonify(res)
         res.status_code = HTTPStatus.OK
     except Exception as e:
@@ -538,37 +693,198 @@ def create_return_deliver():
     pass
 
 @token_required
-def get_return_list():
+def get_return_list(data):
     try:
         deliverer_id = get_return_list.user_id
+        if data.get("since"):
+            return _get_return_changes(deliverer_id, data.get("since"))
+
+        cursor = data.get("cursor")
+        state_filter = data.get("state")
+        limit = current_app.config.get("DISPLAY_LIST_LENGTH")
         res = []
-        print(deliverer_id)
+        # Taken before the list so rows changed meanwhile are sent by delta sync
+        sync_ts = None if cursor else _sync_time()
 
         return_orders = (
-            db.session.query(OrderReturn,OrderMobile,Order.id)
-            .join(Order, Order.id == OrderReturn.order_id)
-            .join(OrderMobile, OrderMobile.order_id == Order.id)
+            db.session.query(
+                OrderReturn.id,
+                OrderReturn.order_id,
+                OrderReturn.ref_no,
+                OrderReturn.date,
+                OrderReturn.is_complete,
+            )
             .filter(OrderReturn.deliverer_id == deliverer_id)
+        )
+        if state_filter:
+            return_orders = return_orders.filter(
+                OrderReturn.is_complete == (state_filter == "complete")
+            )
+        if cursor:
+            # Keyset on (date, id), newest first
+            last_date, last_id = decode_cursor(cursor, datetime, int)
+            return_orders = return_orders.filter(
+                or_(
+                    OrderReturn.date < last_date,
+                    and_(OrderReturn.date == last_date, OrderReturn.id < last_id),
+                )
+            )
+        # Fetch one extra row to know whether there is a next page
+        return_orders = (
+            return_orders.order_by(OrderReturn.date.desc(), OrderReturn.id.desc())
+            .limit(limit + 1)
             .all()
         )
-        #print(return_orders)
+
+        next_cursor = None
+        if len(return_orders) > limit:
+            return_orders = return_orders[:limit]
+            next_cursor = encode_cursor(return_orders[-1].date, return_orders[-1].id)
 
         for i in return_orders:
-            is_complete = i.OrderReturn.is_complete
-            if is_complete == True:
-                is_complete = "complete"
-            else:
-                is_complete = ""
+            res.append(_return_list_item(i))
+
+        info = {"next_cursor": next_cursor}
+        if sync_ts:
+            # Starting point for delta sync with since
+            info["sync_token"] = encode_cursor(sync_ts)
+        res.append(info)
+
+        res = jsonify(res)
+        res.status_code = HTTPStatus.OK
+    except ValueError as e:
+        res = jsonify(status="fail", message=str(e))
+        res.status_code = HTTPStatus.BAD_REQUEST
+    except Exception as e:
+        res = jsonify(status="fail", message=str(e))
+        res.status_code = HTTPStatus.INTERNAL_SERVER_ERROR
+
+    return res
+
+
+# Returns of deliverer changed since the sync token
+# Rejected or cancelled returns are returned as removed return ids
+def _get_return_changes(deliverer_id, since):
+    since_ts, = decode_cursor(since, datetime)
+    sync_ts = max(since_ts, _sync_time())
+    res = []
+    removed = []
+
+    return_orders = (
+        db.session.query(
+            OrderReturn.id,
+            OrderReturn.order_id,
+            OrderReturn.ref_no,
+            OrderReturn.date,
+            OrderReturn.is_complete,
+            OrderReturn.is_cancel,
+            OrderReturn.is_reject,
+            OrderReturn.timestamp,
+        )
+        .filter(
+            OrderReturn.deliverer_id == deliverer_id,
+            OrderReturn.timestamp >= since_ts,
+        )
+        .all()
+    )
+
+    for i in return_orders:
+        if i.is_cancel or i.is_reject:
+            removed.append(i.id)
+        else:
+            res.append(_return_list_item(i))
+
+    res.append({"removed": removed, "sync_token": encode_cursor(sync_ts)})
+    res = jsonify(res)
+    res.status_code = HTTPStatus.OK
+    return res
+
+
+# Return list row to response item
+def _return_list_item(i):
+    return {
+        "return_id": i.id,
+        "order_id": i.order_id,
+        "ref_no": i.ref_no,
+        "date": i.date.strftime("%y-%m-%d"),
+        "is_complete": "complete" if i.is_complete == True else "",
+    }
+
+
+# Queue a dispatch tick now instead of waiting for the periodic one
+# The solve runs on a worker, at most once per DISPATCH_REQUEST_INTERVAL
+# for all deliverers, assigned orders arrive as order_assigned events
+@token_required
+def create_dispatch():
+    try:
+        interval = current_app.config.get("DISPATCH_REQUEST_INTERVAL")
+        if not cache.add("dispatch:requested", create_dispatch.user_id, interval):
+            res = jsonify(status="fail", message="dispatch_pending")
+            res.status_code = HTTPStatus.TOO_MANY_REQUESTS
+            return res
+        dispatch_orders_task.delay()
+        res = jsonify(status="success", message="dispatch_queued")
+        res.status_code = HTTPStatus.ACCEPTED
+    except Exception as e:
+        res = jsonify(status="fail", message=str(e))
+        res.status_code = HTTPStatus.INTERNAL_SERVER_ERROR
+    return res
+
 
+# Unassigned orders with pickup location near the deliverer
+# Geohash cells prefilter sellers on the index, exact distance decides
+@token_required
+def get_nearby_orders(data):
+    try:
+        latitude = data.get("latitude")
+        longitude = data.get("longitude")
+        max_distance = current_app.config.get("MAX_DISTANCE")
+        res = []
+
+        cells = geohash.cover(latitude, longitude, max_distance)
+        orders = (
+            db.session.query(
+                Order.id,
+                Order.date,
+                Order.net,
+                OrderMobile.is_ready,
+                SellerProfile.organization,
+                SellerProfile.street_address,
+                SellerProfile.latitude,
+                SellerProfile.longitude,
+            )
+            .join(OrderMobile, OrderMobile.order_id == Order.id)
+            .join(SellerProfile, SellerProfile.id == Order.seller_prof)
+            .filter(
+                or_(*[SellerProfile.geocell.like(cell + "%") for cell in cells]),
+                OrderMobile.deliverer_id == None,
+                OrderMobile.is_reject == False,
+                Order.is_cancel == False,
+            )
+            .all()
+        )
+
+        distances = gc_distances(
+            longitude,
+            latitude,
+            [i.longitude for i in orders],
+            [i.latitude for i in orders],
+        )
+        for i, distance in zip(orders, distances):
+            if distance > max_distance:
+                continue
             info = {
-                "return_id": i.OrderReturn.id,
-                "order_id":i.OrderReturn.order_id,
-                "ref_no": i.OrderReturn.ref_no,
-                "date": i.OrderReturn.date.strftime("%y-%m-%d"),
-                "is_complete": is_complete,
+                "order_id": i.id,
+                "seller_name": i.organization,
+                "street_address": i.street_address,
+                "Order_date": i.date.strftime("%y-%m-%d"),
+                "net": i.net,
+                "is_ready": i.is_ready,
+                "distance": round(float(distance), 2),
             }
             res.append(info)
 
+        res.sort(key=lambda info: info["distance"])
         res = jsonify(res)
         res.status_code = HTTPStatus.OK
     except Exception as e:
@@ -577,4 +893,92 @@ def get_return_list():
 
     return res
 
-    
+
+# Picked orders of the deliverer in planned delivery order
+@token_required
+def get_order_route(data):
+    try:
+        deliverer_id = get_order_route.user_id
+        latitude = data.get("latitude")
+        longitude = data.get("longitude")
+        time_budget = min(
+            data.get("time_budget") or current_app.config.get("ROUTE_TIME_BUDGET"),
+            current_app.config.get("ROUTE_MAX_TIME_BUDGET"),
+        )
+        res = []
+
+        orders = (
+            db.session.query(
+                Order.id,
+                Order.ref_no,
+                Order.net,
+                OrderMobile.cus_id,
+                OrderMobile.latitude,
+                OrderMobile.longitude,
+            )
+            .join(OrderMobile, OrderMobile.order_id == Order.id)
+            .filter(
+                OrderMobile.deliverer_id == deliverer_id,
+                OrderMobile.state == PICKED,
+            )
+            .all()
+        )
+
+        # Index 0 is the deliverer, order i is point i + 1
+        longs = [longitude] + [i.longitude for i in orders]
+        latis = [latitude] + [i.latitude for i in orders]
+        dist = gc_distance_matrix(longs, latis, longs, latis)
+        path = plan_route(dist, time_budget / 1000)
+
+        last = 0
+        total = 0
+        for seq, point in enumerate(path, start=1):
+            i = orders[point - 1]
+            total += dist[last, point]
+            info = {
+                "sequence": seq,
+                "order_id": i.id,
+                "Order_ref_no": i.ref_no,
+                "net": i.net,
+                "cus_id": i.cus_id,
+                "order_latitude": i.latitude,
+                "order_longitude": i.longitude,
+                "distance": round(float(dist[last, point]), 2),
+            }
+            res.append(info)
+            last = point
+
+        res.append({"total_distance": round(float(total), 2)})
+        res = jsonify(res)
+        res.status_code = HTTPStatus.OK
+    except Exception as e:
+        res = jsonify(status="fail", message=str(e))
+        res.status_code = HTTPStatus.INTERNAL_SERVER_ERROR
+
+    return res
+
+
+# Stream order events of the deliverer as server sent events
+# Resume after last_event_id when the client reconnects, a missing or
+# malformed id starts from the newest event
+@token_required
+def get_event_stream(last_event_id):
+    channel = deliverer_channel(get_event_stream.user_id)
+    heartbeat = current_app.config.get("EVENT_HEARTBEAT")
+    if not last_event_id or not events.valid_id(last_event_id):
+        last_event_id = events.last_id(channel)
+
+    def stream(last_id):
+        yield "retry: 3000\n\n"
+        while True:
+            items = events.read(channel, last_id, heartbeat)
+            if not items:
+                yield ": heartbeat\n\n"
+            for event_id, event, data in items:
+                last_id = event_id
+                yield f"id: {event_id}\nevent: {event}\ndata: {json.dumps(data)}\n\n"
+
+    res = Response(stream_with_context(stream(last_event_id)), mimetype="text/event-stream")
+    res.headers["Cache-Control"] = "no-cache"
+    res.headers["X-Accel-Buffering"] = "no"
+    return res
@@ -1,9 +1,366 @@
 import datetime
 
-# Generate unique material ref key
-def gen_ref_key(tbl, type):
-    count = tbl.query.count()
-    count += 1
-    return type+str(count)+'-'+datetime.datetime.now().strftime('%y%m%d')
+import numpy as np
+from flask import current_app
+from sqlalchemy import case, func, or_
+from sqlalchemy.exc import IntegrityError
 
+from application import cache, celery, db, events, positions
+from application.models import (
+    DeliveryVehicle,
+    DeliveryVehicleSpeedStat,
+    Order,
+    OrderMobile,
+    SellerPrepStat,
+    SellerProfile,
+)
+from application.util import eta, geohash
+from application.util.assignment import min_cost_assignment
+from application.util.backend import redis_client
+from application.util.calc import gc_distance, gc_distances, gc_distance_matrix
+from application.util.order_state import (
+    ACCEPTED,
+    ORDER_TRANSITIONS,
+    PENDING,
+    PICKED,
+    RETURN_TRANSITIONS,
+    STATE_FLAGS,
+    STATE_TIMES,
+)
 
+
+# Event channel of a deliverer
+def deliverer_channel(deliverer_id):
+    return "deliverer:" + str(deliverer_id)
+
+
+# Push order change to deliverer event stream
+# Call after commit so subscribers never see rolled back changes
+def publish_order_event(deliverer_id, event, order_id):
+    events.publish(deliverer_channel(deliverer_id), event, {"order_id": order_id})
+
+
+# Move order or return of deliverer to the next lifecycle state
+# Single conditional update, returns False when the row is not in a state
+# the action is allowed from. at is when the action happened, now when None
+def apply_transition(model, ord_id, deliverer_id, action, at=None):
+    transitions = ORDER_TRANSITIONS if model is OrderMobile else RETURN_TRANSITIONS
+    from_states, to_state = transitions[action]
+
+    values = {getattr(model, k): v for k, v in STATE_FLAGS.get(to_state, {}).items()}
+    values[model.state] = to_state
+    time_column = STATE_TIMES.get(to_state)
+    if time_column and hasattr(model, time_column):
+        values[getattr(model, time_column)] = at or datetime.datetime.utcnow()
+    q = db.session.query(model).filter(
+        model.order_id == ord_id, model.state.in_(from_states)
+    )
+    if action == "accept":
+        values[model.deliverer_id] = deliverer_id
+        q = q.filter(model.deliverer_id == None)
+    else:
+        q = q.filter(model.deliverer_id == deliverer_id)
+    return q.update(values, synchronize_session=False) > 0
+
+
+# Time an action of the deliverer happened, from the client timestamp
+# Clamped to no later than now and no earlier than the order date,
+# a timestamp without offset is taken as UTC
+def transition_time(ord_id, client_ts):
+    if client_ts.tzinfo:
+        client_ts = client_ts.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    order_date = db.session.query(Order.date).filter(Order.id == ord_id).scalar()
+    if order_date and client_ts < order_date:
+        client_ts = order_date
+    return min(client_ts, datetime.datetime.utcnow())
+
+
+# Unassigned orders ready or about to be ready for pickup
+def _dispatch_orders():
+    ahead = datetime.timedelta(minutes=current_app.config.get("DISPATCH_READY_AHEAD"))
+    now = datetime.datetime.utcnow()
+    orders = (
+        db.session.query(
+            Order.id,
+            Order.date,
+            OrderMobile.is_ready,
+            OrderMobile.prep_duration,
+            SellerProfile.latitude,
+            SellerProfile.longitude,
+        )
+        .join(OrderMobile, OrderMobile.order_id == Order.id)
+        .join(SellerProfile, SellerProfile.id == Order.seller_prof)
+        .filter(
+            OrderMobile.deliverer_id == None,
+            OrderMobile.state == PENDING,
+            OrderMobile.is_reject == False,
+            or_(OrderMobile.is_ready == True, OrderMobile.is_accept == True),
+            Order.is_cancel == False,
+        )
+        .all()
+    )
+    # Prep duration in minutes from order time
+    return [
+        i
+        for i in orders
+        if i.is_ready
+        or (
+            i.prep_duration is not None
+            and i.date + datetime.timedelta(minutes=i.prep_duration) <= now + ahead
+        )
+    ]
+
+
+# Match unassigned orders to online deliverers in one batch
+# Cost is pickup distance plus a penalty per order the deliverer already
+# carries, solved as a minimum cost assignment over the whole city
+# Returns claimed (order_id, deliverer_id) pairs, events are published
+def dispatch_orders():
+    max_pickup = current_app.config.get("DISPATCH_MAX_PICKUP_KM")
+    load_penalty = current_app.config.get("DISPATCH_LOAD_PENALTY_KM")
+    max_load = current_app.config.get("DISPATCH_MAX_LOAD")
+
+    orders = _dispatch_orders()
+    if not orders:
+        return []
+
+    # Deliverers online near any pickup point, one lookup per cell of
+    # pickups around their centre, the cost matrix drops the ones too far
+    cells = {}
+    for i in orders:
+        precision = geohash.cover_precision(i.latitude, max_pickup)
+        cells.setdefault(geohash.encode(i.latitude, i.longitude, precision), []).append(i)
+    riders = {}
+    for group in cells.values():
+        latitude = sum(i.latitude for i in group) / len(group)
+        longitude = sum(i.longitude for i in group) / len(group)
+        spread = gc_distances(
+            longitude, latitude, [i.longitude for i in group], [i.latitude for i in group]
+        ).max()
+        for rider_id, _ in positions.within(latitude, longitude, max_pickup + spread):
+            riders[rider_id] = None
+    if not riders:
+        return []
+    rider_ids = list(riders)
+
+    load = dict(
+        db.session.query(OrderMobile.deliverer_id, func.count(OrderMobile.id))
+        .filter(
+            OrderMobile.deliverer_id.in_(rider_ids),
+            OrderMobile.state.in_((ACCEPTED, PICKED)),
+        )
+        .group_by(OrderMobile.deliverer_id)
+        .all()
+    )
+    rider_ids = [r for r in rider_ids if load.get(r, 0) < max_load]
+    coords = [positions.get(r) for r in rider_ids]
+    rider_ids = [r for r, pos in zip(rider_ids, coords) if pos]
+    coords = [pos for pos in coords if pos]
+    if not rider_ids:
+        return []
+
+    dist = gc_distance_matrix(
+        [pos[1] for pos in coords],
+        [pos[0] for pos in coords],
+        [i.longitude for i in orders],
+        [i.latitude for i in orders],
+    )
+    penalty = np.array([load.get(r, 0) * load_penalty for r in rider_ids])
+    cost = np.where(dist <= max_pickup, dist + penalty[:, None], np.inf)
+
+    claimed = []
+    for row, col in min_cost_assignment(cost):
+        order_id, rider_id = orders[col].id, rider_ids[row]
+        # Same conditional claim as a manual accept, skip orders taken meanwhile
+        if apply_transition(OrderMobile, order_id, rider_id, "accept"):
+            claimed.append((order_id, rider_id))
+    db.session.commit()
+
+    for order_id, rider_id in claimed:
+        publish_order_event(rider_id, "order_assigned", order_id)
+    return claimed
+
+
+# Periodic dispatch tick from celery beat
+# Positions reach the worker only through Redis, without REDIS_URL it
+# would see no deliverer online so the tick is skipped with a warning
+@celery.task(name='sale.dispatch_orders')
+def dispatch_orders_task():
+    if redis_client(current_app) is None:
+        current_app.logger.warning("dispatch skipped, REDIS_URL is not set")
+        return []
+    try:
+        return dispatch_orders()
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+# Add a sample to a rolling mean kept in one row
+# Plain mean while warming up, then each sample weighs 1/ETA_STATS_WINDOW
+def _add_rolling_sample(model, key_column, key, mean_column, value):
+    window = current_app.config.get("ETA_STATS_WINDOW")
+    weight = case((model.samples < window, model.samples + 1), else_=window)
+    # MySQL applies SET left to right, mean must use samples before increment
+    values = [
+        (mean_column, mean_column + (value - mean_column) / weight),
+        (model.samples, model.samples + 1),
+    ]
+
+    def update():
+        return (
+            db.session.query(model)
+            .filter(key_column == key)
+            .update(
+                values,
+                synchronize_session=False,
+                update_args={"preserve_parameter_order": True},
+            )
+        )
+
+    if update():
+        return
+    try:
+        with db.session.begin_nested():
+            db.session.add(model(**{key_column.key: key, mean_column.key: value, "samples": 1}))
+    except IntegrityError:
+        # First sample added meanwhile by another request
+        update()
+
+
+# Count time from order to pickup as prep time of the seller
+def record_prep_time(ord_id):
+    order = (
+        db.session.query(Order.seller_prof, Order.date, OrderMobile.pick_time)
+        .join(OrderMobile, OrderMobile.order_id == Order.id)
+        .filter(Order.id == ord_id)
+        .first()
+    )
+    if not order or not order.date or not order.pick_time:
+        return
+    minutes = (order.pick_time - order.date).total_seconds() / 60
+    if 0 < minutes <= current_app.config.get("ETA_MAX_PREP"):
+        _add_rolling_sample(
+            SellerPrepStat, SellerPrepStat.seller_prof, order.seller_prof,
+            SellerPrepStat.prep_mean, minutes,
+        )
+
+
+# Count pickup to drop speed for the vehicle type of the deliverer
+# delivered_at is when the order was dropped, now when None
+def record_delivery_speed(ord_id, deliverer_id, delivered_at=None):
+    order = (
+        db.session.query(
+            OrderMobile.pick_time,
+            OrderMobile.latitude,
+            OrderMobile.longitude,
+            SellerProfile.latitude.label("seller_latitude"),
+            SellerProfile.longitude.label("seller_longitude"),
+        )
+        .join(Order, Order.id == OrderMobile.order_id)
+        .join(SellerProfile, SellerProfile.id == Order.seller_prof)
+        .filter(OrderMobile.order_id == ord_id)
+        .first()
+    )
+    vehicle = (
+        db.session.query(DeliveryVehicle.type).filter_by(deliverer_id=deliverer_id).first()
+    )
+    if not order or not order.pick_time or not vehicle:
+        return
+    delivered_at = delivered_at or datetime.datetime.utcnow()
+    hours = (delivered_at - order.pick_time).total_seconds() / 3600
+    distance = gc_distance(
+        order.seller_longitude, order.seller_latitude, order.longitude, order.latitude
+    ) * current_app.config.get("ETA_ROUTE_FACTOR")
+    # Drop deliveries closed in under a minute, deliverer did not ride
+    if hours * 60 < 1:
+        return
+    _add_rolling_sample(
+        DeliveryVehicleSpeedStat, DeliveryVehicleSpeedStat.type, vehicle.type,
+        DeliveryVehicleSpeedStat.speed_mean, distance / hours,
+    )
+
+
+# Mean delivery speed of the deliverer's vehicle type in km/h
+def _deliverer_speed(deliverer_id):
+    key = "speed:" + str(deliverer_id)
+    speed = cache.get(key)
+    if speed is None:
+        row = (
+            db.session.query(DeliveryVehicleSpeedStat.speed_mean)
+            .join(DeliveryVehicle, DeliveryVehicle.type == DeliveryVehicleSpeedStat.type)
+            .filter(DeliveryVehicle.deliverer_id == deliverer_id)
+            .first()
+        )
+        speed = row.speed_mean if row else current_app.config.get("ETA_DEFAULT_SPEED")
+        cache.set(key, speed, current_app.config.get("ETA_STATS_TTL"))
+    return speed
+
+
+# Pickup and drop ETA of orders of a deliverer as {order_id: {...}}
+# Delivered and cancelled orders have no ETA and are left out
+# Reused for ETA_CACHE_TTL seconds, key holds the state so a
+# transition gives a fresh estimate
+def order_etas(deliverer_id, orders):
+    orders = [(i, s) for i, s in orders if s in (PENDING, ACCEPTED, PICKED)]
+    keys = {"eta:%s:%s" % (i, s): i for i, s in orders}
+    found = cache.get_many(keys)
+    res = {keys[k]: v for k, v in found.items()}
+    missing = [keys[k] for k in keys if k not in found]
+    if not missing:
+        return res
+
+    rows = (
+        db.session.query(
+            Order.id,
+            Order.date,
+            OrderMobile.state,
+            OrderMobile.is_ready,
+            OrderMobile.prep_duration,
+            OrderMobile.latitude,
+            OrderMobile.longitude,
+            SellerProfile.latitude.label("seller_latitude"),
+            SellerProfile.longitude.label("seller_longitude"),
+            SellerPrepStat.prep_mean,
+        )
+        .join(OrderMobile, OrderMobile.order_id == Order.id)
+        .join(SellerProfile, SellerProfile.id == Order.seller_prof)
+        .outerjoin(SellerPrepStat, SellerPrepStat.seller_prof == Order.seller_prof)
+        .filter(Order.id.in_(missing))
+        .all()
+    )
+
+    now = datetime.datetime.utcnow().replace(microsecond=0)
+    rider = positions.get(deliverer_id)
+    rider = rider[:2] if rider else None
+    speed = _deliverer_speed(deliverer_id)
+    route_factor = current_app.config.get("ETA_ROUTE_FACTOR")
+    computed = {}
+    for i in rows:
+        if i.is_ready:
+            ready_at = now
+        else:
+            # Longer of seller estimate and seller history, riders should not wait
+            prep = max(
+                i.prep_duration or 0,
+                i.prep_mean or (0 if i.prep_duration else current_app.config.get("ETA_DEFAULT_PREP")),
+            )
+            ready_at = i.date + datetime.timedelta(minutes=prep)
+        pickup, drop = eta.estimate(
+            now,
+            ready_at,
+            rider,
+            (i.seller_latitude, i.seller_longitude),
+            (i.latitude, i.longitude),
+            speed,
+            route_factor,
+            picked=i.state == PICKED,
+        )
+        value = {
+            "pickup_eta": pickup.strftime("%Y-%m-%d %H:%M:%S") if pickup else None,
+            "drop_eta": drop.strftime("%Y-%m-%d %H:%M:%S"),
+        }
+        res[i.id] = value
+        computed["eta:%s:%s" % (i.id, i.state)] = value
+    cache.set_many(computed, current_app.config.get("ETA_CACHE_TTL"))
+    return res
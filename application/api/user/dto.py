@@ -82,3 +82,9 @@ vehicle_parser = RequestParser(bundle_errors=True)
 vehicle_parser.add_argument('type', type=str, location="json", required=True, nullable=False, help="type,max=8")
 vehicle_parser.add_argument('reg_no', type=str, location="json", required=True, nullable=False, help="reg no, max=10")
 vehicle_parser.add_argument('note', type=str, location="json", required=False, nullable=True, help="note, max=100")
+
+
+# Deliverer location fixes
+# fixes: [{"latitude": 6.9271, "longitude": 79.8612, "recorded_at": 1658301600, "accuracy": 8.5, "speed": 4.2, "heading": 90}]
+location_parser = RequestParser(bundle_errors=True)
+location_parser.add_argument('fixes', type=list, location="json", required=True, nullable=False, help="List of GPS fixes, recorded_at in unix seconds")
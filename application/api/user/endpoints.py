@@ -2,10 +2,11 @@ from http import HTTPStatus
 
 from flask_restx import Namespace, Resource
 
-from .dto import (login_parser, prof_model, prof_parser, reg_parser,
+from .dto import (location_parser, login_parser, prof_model, prof_parser, reg_parser,
                   user_model, vehicle_model, vehicle_parser)
 from .functions import (get_logged_in_user, get_profile, login,  # get_location
-                        logout, profile_save, register,vehicle_profile_save,get_vehicle_profile)
+                        logout, profile_save, register,vehicle_profile_save,get_vehicle_profile,
+                        save_location)
 
 user_ns = Namespace(name="user", validate=True)
 
@@ -149,9 +150,27 @@ class Vehicle(Resource):
         return vehicle_profile_save(data)
 
 
+# Deliverer location
+# Trigger from the app every few seconds while on duty
+@user_ns.route("/location", endpoint="user_location")
+class Location(Resource):
+    """Handles HTTP requests to URL: /api/v1/user/location"""
 
+    @user_ns.doc(security="Bearer")
+    @user_ns.expect(location_parser)
+    @user_ns.response(int(HTTPStatus.ACCEPTED), "Fixes accepted.")
+    @user_ns.response(int(HTTPStatus.BAD_REQUEST), "Validation error.")
+    @user_ns.response(int(HTTPStatus.UNAUTHORIZED), "Token is invalid or expired.")
+    @user_ns.response(int(HTTPStatus.INTERNAL_SERVER_ERROR), "Internal server error.")
+    def post(self):
+        """Report batch of GPS fixes
 
+        Demo pass values
+        {"fixes": [{"latitude": 6.9271, "longitude": 79.8612, "recorded_at": 1658301600}]}
 
-
-    
-
+        Intended Result
+        Fixes are buffered and written in bulk, up to LOCATION_BATCH_LENGTH per request.
+        Optional accuracy (m), speed (m/s) and heading (deg) per fix.
+        """
+        data = location_parser.parse_args()
+        return save_location(data)
@@ -1,4 +1,6 @@
 from email import message
+import math
+import time
 from os import stat
 import re
 from random import randint
@@ -6,12 +8,12 @@ from datetime import datetime
 from http import HTTPStatus
 from flask import current_app, jsonify
 
-from application import db
+from application import db, locations, positions
 from application.models import DeliveryUser, DeliveryProfile, DeliveryVehicle,DeliveryBlacklistToken
-from application.helpers import token_required
+from application.helpers import token_required, gen_ref_key
 from application.util.datetime_util import remaining_fromtimestamp, format_timespan_digits
 from application.util.otp import Hotp
-from .utils import gen_ref_key, save_image, delete_image, parse_push_notification
+from .utils import save_image, delete_image, parse_push_notification, flush_locations
 
 
 # Create new user
@@ -165,6 +167,7 @@ def logout():
     user = DeliveryUser.query.filter_by(public_id = public_id).first()
     user.is_logged_in = False
     db.session.commit()
+    positions.remove(user.id)
     response_dict = dict(status="success", message="successfully logged out")
     return response_dict, HTTPStatus.OK
 
@@ -201,7 +204,7 @@ def profile_save(data):
             prof.last_name = l_name
             db.session.commit()
         else:
-            ref_no = gen_ref_key(DeliveryProfile, 'DP')
+            ref_no = gen_ref_key('DP')
             if image:
                 prof_image = save_image(image)
             new_profile = DeliveryProfile(
@@ -295,3 +298,81 @@ def get_vehicle_profile():
     return prof
 
 
+####### Location #####
+
+# Validate a location fix and shape it as a buffer row
+def _location_row(deliverer_id, fix):
+    if not isinstance(fix, dict):
+        raise ValueError("invalid_fix")
+    try:
+        row = dict(
+            deliverer_id=deliverer_id,
+            latitude=float(fix["latitude"]),
+            longitude=float(fix["longitude"]),
+            recorded_at=float(fix["recorded_at"]),
+            accuracy=None if fix.get("accuracy") is None else float(fix["accuracy"]),
+            speed=None if fix.get("speed") is None else float(fix["speed"]),
+            heading=None if fix.get("heading") is None else float(fix["heading"]),
+        )
+    except (KeyError, TypeError, ValueError):
+        raise ValueError("invalid_fix")
+    if not (-90 <= row["latitude"] <= 90 and -180 <= row["longitude"] <= 180):
+        raise ValueError("invalid_fix")
+    # Unix time within the accepted window, also rules out inf and nan
+    now = time.time()
+    if not (
+        math.isfinite(row["recorded_at"])
+        and now - current_app.config.get("LOCATION_MAX_AGE")
+        <= row["recorded_at"]
+        <= now + current_app.config.get("LOCATION_MAX_AHEAD")
+    ):
+        raise ValueError("invalid_fix")
+    return row
+
+
+# Save batch of deliverer location fixes
+# Fixes are buffered and written in bulk, no commit per request
+@token_required
+def save_location(data):
+    user_id = save_location.user_id
+    fixes = data.get("fixes")
+
+    try:
+        if len(fixes) > current_app.config.get("LOCATION_BATCH_LENGTH"):
+            raise ValueError("too_many_fixes")
+        rows = [_location_row(user_id, fix) for fix in fixes]
+        if rows:
+            # Newest fix is the current position unless already stale,
+            # an old offline batch must not bring the deliverer online
+            last = max(rows, key=lambda row: row["recorded_at"])
+            if last["recorded_at"] >= time.time() - current_app.config.get("POSITION_TTL"):
+                positions.update(
+                    user_id, last["latitude"], last["longitude"], last["recorded_at"]
+                )
+
+        if rows and locations.push(rows):
+            try:
+                flush_locations()
+            except Exception:
+                # Fixes are back in the buffer, next flush retries them
+                current_app.logger.exception("location flush failed")
+
+        res = jsonify(
+            status="success",
+            message="location_accepted",
+            accepted=len(rows)
+        )
+        res.status_code = HTTPStatus.ACCEPTED
+    except ValueError as e:
+        res = jsonify(
+            status="fail",
+            message=str(e)
+        )
+        res.status_code = HTTPStatus.BAD_REQUEST
+    except Exception as e:
+        res = jsonify(
+            status="fail",
+            message=str(e)
+        )
+        res.status_code = HTTPStatus.INTERNAL_SERVER_ERROR
+    return res
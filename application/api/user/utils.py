@@ -1,16 +1,12 @@
 import datetime
 from flask import current_app
 
-from application import celery
+from application import celery, db, locations
+from application.models import DeliveryLocation
 from application.helpers import save_image_helper, delete_image_helper, send_push_notification
 
 IMAGE_PATH = current_app.config.get('UPLOAD_PATH') +'/img/del_usr'
 
-# Generate unique material ref key
-def gen_ref_key(tbl, type):
-    count = tbl.query.count()
-    count += 1
-    return type+str(count)+'-'+datetime.datetime.now().strftime('%y%m%d')
 
 
 # Save image
@@ -29,4 +25,34 @@ def delete_image(form_image):
 def parse_push_notification(payload):
     print("hello2")
     send_push_notification(payload)
-    
+
+
+# Write buffered location fixes with one multi row insert
+# Fixes go back to the buffer when the insert fails, a fix that can not
+# be converted is dropped on its own
+def flush_locations():
+    rows = locations.drain()
+    if not rows:
+        return 0
+    try:
+        values = []
+        for row in rows:
+            try:
+                recorded_at = datetime.datetime.utcfromtimestamp(row["recorded_at"])
+            except (KeyError, TypeError, ValueError, OverflowError, OSError):
+                current_app.logger.warning("dropped invalid location fix %r", row)
+                continue
+            values.append(dict(row, recorded_at=recorded_at))
+        if values:
+            with db.engine.begin() as conn:
+                conn.execute(DeliveryLocation.__table__.insert(), values)
+    except Exception:
+        locations.restore(rows)
+        raise
+    return len(values)
+
+
+# Flush shared location buffer from celery beat
+@celery.task(name='user.flush_locations')
+def flush_locations_task():
+    return flush_locations()
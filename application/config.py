@@ -15,6 +15,8 @@ class Config():
     TOKEN_EXPIRE_HOURS = 3
     TOKEN_EXPIRE_MINUTES = 0
     DISPLAY_LIST_LENGTH = 2 # Length of items displace at onece
+    REF_BLOCK_SIZE = 20 # Ref numbers reserved by a worker at once
+    SYNC_TOKEN_OVERLAP = 5 # Seconds sync tokens are set back to cover in flight transactions
 
     # Statci files
     UPLOAD_PATH = os.getenv('upload_path')
@@ -23,6 +25,55 @@ class Config():
     CELERY_BROKER_URL = os.getenv('celery_broker')
     CELERY_RESULT_BACKEND = os.getenv('celery_backend')
 
+    # Redis shared by events, location buffer, positions and cache
+    REDIS_URL = os.getenv('redis_url') # In process backends when not set
+    CACHE_MAX_ITEMS = 10000 # Keys kept by the in process cache before least recently used are dropped
+
+    # Server sent events
+    EVENT_STREAM_LENGTH = 1000 # Events kept per channel for resume
+    EVENT_HEARTBEAT = 15 # Seconds
+
+    # Deliverer location ingest
+    LOCATION_BUFFER_LENGTH = 50000 # Fixes kept before oldest are dropped
+    LOCATION_FLUSH_SIZE = 1000 # Fixes written per insert
+    LOCATION_FLUSH_INTERVAL = 10 # Seconds
+    LOCATION_BATCH_LENGTH = 100 # Fixes accepted per request
+    LOCATION_MAX_AGE = 86400 # Seconds, older fixes are rejected
+    LOCATION_MAX_AHEAD = 300 # Seconds a device clock may run ahead
+
+    # Online deliverer positions
+    POSITION_TTL = 60 # Seconds without a fix before deliverer is offline
+
+    # Order actions applied per batched transitions request
+    TRANSITION_BATCH_LENGTH = 50
+
+    # Auto dispatch of unassigned orders
+    DISPATCH_INTERVAL = 30 # Seconds between dispatch ticks
+    DISPATCH_MAX_PICKUP_KM = 5 # Farthest deliverer considered for a pickup
+    DISPATCH_LOAD_PENALTY_KM = 2 # Extra cost per order deliverer already carries
+    DISPATCH_MAX_LOAD = 3 # Deliverers carrying this many orders are skipped
+    DISPATCH_READY_AHEAD = 10 # Minutes before prep is done an order can be dispatched
+    DISPATCH_REQUEST_INTERVAL = 10 # Seconds between dispatch runs deliverers can request
+
+    # Delivery ETA
+    ETA_CACHE_TTL = 30 # Seconds an order ETA is reused
+    ETA_STATS_TTL = 300 # Seconds vehicle speed stats are reused
+    ETA_STATS_WINDOW = 50 # Samples in rolling prep time and speed means
+    ETA_ROUTE_FACTOR = 1.3 # Road distance over great circle distance
+    ETA_DEFAULT_SPEED = 20 # km/h without speed stats
+    ETA_DEFAULT_PREP = 15 # Minutes without prep time or stats
+    ETA_MAX_PREP = 180 # Minutes, longer pickups are not counted as prep time
+
+    # Celery beat
+    CELERYBEAT_SCHEDULE = {
+        # Write fixes left in a shared location buffer while ingest is idle
+        "flush-locations": {"task": "user.flush_locations", "schedule": LOCATION_FLUSH_INTERVAL},
+    }
+    # Dispatch needs positions shared through Redis, a worker with in
+    # process backends sees no deliverer online
+    if REDIS_URL:
+        CELERYBEAT_SCHEDULE["dispatch-orders"] = {"task": "sale.dispatch_orders", "schedule": DISPATCH_INTERVAL}
+
     # One signal
     ONESIGNAL_APP_ID =  os.getenv('onesignal_id')
     ONESIGNAL_API_ENDPOINT = os.getenv('onesignal_endpoint')
@@ -31,7 +82,20 @@ class Config():
     # Marketing
     MAX_DISTANCE = 5
 
+    # Route planning time budget in milliseconds
+    ROUTE_TIME_BUDGET = 200
+    ROUTE_MAX_TIME_BUDGET = 2000
+
     PAYMENT_METHODS = {"Cash":"s", "Card":"c", "COD":"o"}
 
+    # Balance snapshot after this many ledger entries of a deliverer
+    LEDGER_SNAPSHOT_EVERY = 50
+
+    # Statement rows fetched per round trip of the server side cursor
+    STATEMENT_BATCH_SIZE = 500
+
+    # Seconds a finance summary is reused, API finance writes start a new one
+    FINANCE_SUMMARY_TTL = 300
+
     #MINIMUM WITHDRAWAL AMOUNT
     MIN_WITHDRAWAL_AMOUNT=5000
@@ -1,13 +1,17 @@
 from functools import wraps
+import datetime
 import os
 import secrets
+import threading
 from urllib import response
 import requests
 from PIL import Image
 from flask import request, current_app
+from sqlalchemy.exc import IntegrityError
 from werkzeug.exceptions import Unauthorized
 
-from .models import DeliveryUser
+from . import db
+from .models import DeliveryUser, RefSequence
 
 _REALM_CUSTOMERS = "000000000"
 
@@ -70,6 +74,50 @@ class ApiUnauthorized(Unauthorized):
             www_auth_value += f', error_description="{error_description}"'
         return www_auth_value
 
+# Generate unique material ref key
+# Numbers come from blocks reserved in ref_sequence, most calls are an
+# in memory increment. Unused numbers of a block are skipped when the
+# worker stops, numbers stay unique across workers
+_ref_blocks = {}
+_ref_lock = threading.Lock()
+
+
+def gen_ref_key(type):
+    with _ref_lock:
+        next_value, end = _ref_blocks.get(type, (0, 0))
+        if next_value >= end:
+            next_value, end = _reserve_ref_block(type)
+        _ref_blocks[type] = (next_value + 1, end)
+    return type+str(next_value)+'-'+datetime.datetime.now().strftime('%y%m%d')
+
+
+# Reserve next block of numbers of a prefix as [start, end)
+# Own transaction, a rollback of the request must not free the block
+def _reserve_ref_block(type):
+    size = current_app.config.get("REF_BLOCK_SIZE")
+    seq = RefSequence.__table__
+    for _ in range(2):
+        with db.engine.begin() as conn:
+            updated = conn.execute(
+                seq.update()
+                .where(seq.c.name == type)
+                .values(next_value=seq.c.next_value + size)
+            ).rowcount
+            if updated:
+                end = conn.execute(
+                    db.select(seq.c.next_value).where(seq.c.name == type)
+                ).scalar()
+                return end - size, end
+        try:
+            with db.engine.begin() as conn:
+                conn.execute(seq.insert().values(name=type, next_value=1 + size))
+            return 1, 1 + size
+        except IntegrityError:
+            # Created meanwhile by another worker, reserve from it
+            continue
+    raise RuntimeError("ref_sequence_unavailable")
+
+
 # Save image
 def save_image_helper(form_image, path):
     try:
@@ -198,6 +198,11 @@ class SellerProfile(db.Model):
     contact_no = db.Column(db.String(15), unique=True, nullable=False)
     longitude = db.Column(db.Float, nullable=False)
     latitude = db.Column(db.Float, nullable=False)
+    geocell = db.Column(
+        db.String(12),
+        db.Computed("ST_GeoHash(longitude, latitude, 12)", persisted=True),
+        index=True,
+    )  # Geohash of pickup location for nearby order search
     image = db.Column(db.String(50), nullable=False, default="default_avatar.png")
     seller_id = db.Column(
         db.Integer, db.ForeignKey("seller_user.id"), nullable=False, unique=True
@@ -533,6 +538,24 @@ class SellerPaymentFine(db.Model):
         return f" SellerPaymentFine('{self.id}')"
 
 
+# Rolling prep time of seller orders, minutes from order to pickup
+# Updated in place on every pickup, read by delivery ETA
+class SellerPrepStat(db.Model):
+
+    seller_prof = db.Column(
+        db.Integer, db.ForeignKey("seller_profile.id"), primary_key=True
+    )
+    samples = db.Column(db.Integer, nullable=False, default=0)
+    prep_mean = db.Column(db.Float, nullable=False)
+    timestamp = db.Column(
+        db.TIMESTAMP,
+        server_default=db.text("CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP"),
+    )
+
+    def __repr__(self):
+        return f"SellerPrepStat('{self.seller_prof}')"
+
+
 #  Seller Blacklist tockents
 class SellerBlacklistToken(db.Model):
 
@@ -749,6 +772,50 @@ class DeliveryBank(db.Model):
         return f"DeliveryBank'{self.id}')"
 
 
+# Rolling delivery speed of a vehicle type in km/h
+# Updated in place on every delivery, read by delivery ETA
+class DeliveryVehicleSpeedStat(db.Model):
+
+    type = db.Column(db.String(8), primary_key=True)
+    samples = db.Column(db.Integer, nullable=False, default=0)
+    speed_mean = db.Column(db.Float, nullable=False)
+    timestamp = db.Column(
+        db.TIMESTAMP,
+        server_default=db.text("CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP"),
+    )
+
+    def __repr__(self):
+        return f"DeliveryVehicleSpeedStat('{self.type}')"
+
+
+# Deliverer location fix reported by the app
+# Append only, written in batches from the location buffer
+class DeliveryLocation(db.Model):
+
+    id = db.Column(db.BigInteger, primary_key=True)
+    latitude = db.Column(db.Float, nullable=False)
+    longitude = db.Column(db.Float, nullable=False)
+    accuracy = db.Column(db.Float, nullable=True)
+    speed = db.Column(db.Float, nullable=True)
+    heading = db.Column(db.Float, nullable=True)
+    recorded_at = db.Column(db.DateTime, nullable=False)
+    deliverer_id = db.Column(
+        db.Integer, db.ForeignKey("delivery_user.id"), nullable=False
+    )
+    timestamp = db.Column(
+        db.TIMESTAMP,
+        server_default=db.text("CURRENT_TIMESTAMP"),
+    )
+
+    # Track of a deliverer over a time range
+    __table_args__ = (
+        db.Index("ix_delivery_location_deliverer_recorded", "deliverer_id", "recorded_at"),
+    )
+
+    def __repr__(self):
+        return f"DeliveryLocation('{self.id}')"
+
+
 # Delivery payment
 class DeliveryPayment(db.Model):
 
@@ -765,6 +832,9 @@ class DeliveryPayment(db.Model):
     fine = db.Column(
         db.Numeric(precision=12, scale=2, asdecimal=True, decimal_return_scale=None)
     )  # Fine
+    ledger_seq = db.Column(
+        db.Integer, nullable=False, default=0, server_default=db.text("0")
+    )  # Ledger entries written, drives snapshots
     deliverer_id = db.Column(
         db.Integer, db.ForeignKey("delivery_user.id"), nullable=False
     )
@@ -773,6 +843,10 @@ class DeliveryPayment(db.Model):
         server_default=db.text("CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP"),
     )
 
+    __table_args__ = (
+        db.Index("ix_delivery_payment_deliverer", "deliverer_id", "id"),
+    )
+
     # DeliveryPaymentWithdrawal one to many
     withdrawal = db.relationship(
         "DeliveryPaymentWithdrawal", backref="deliverypayment", lazy=True
@@ -827,6 +901,10 @@ class DeliveryPaymentWithdrawal(db.Model):
         "DeliveryPaymentArrears", backref="deliverypaymentwithdrawal", lazy=True
     )
 
+    __table_args__ = (
+        db.Index("ix_delivery_payment_withdrawal_pay_date", "pay_id", "date"),
+    )
+
     def __repr__(self):
         return f"DeliveryPaymentWithdrawal('{self.ref_no}')"
 
@@ -856,6 +934,18 @@ class DeliveryPaymentArrears(db.Model):
         server_default=db.text("CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP"),
     )
 
+    __table_args__ = (
+        db.Index(
+            "ix_delivery_payment_arrears_open",
+            "pay_id",
+            "is_receive",
+            "is_deduct",
+            "withdrawl_id",
+            "order_id",
+            "amount",
+        ),
+    )
+
     def __repr__(self):
         return f"DeliveryPaymentArrears('{self.id}')"
 
@@ -875,6 +965,10 @@ class DeliveryPaymentCashInHand(db.Model):
         server_default=db.text("CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP"),
     )
 
+    __table_args__ = (
+        db.Index("ix_delivery_payment_cih_open", "pay_id", "is_deposit", "order_id"),
+    )
+
     def __repr__(self):
         return f"DeliveryPaymentCashInHand('{self.id}')"
 
@@ -901,6 +995,10 @@ class DeliveryPaymentDeposit(db.Model):
         "DeliveryPaymentCashInHand", backref="deliverypaymentdeposit", lazy=True
     )
 
+    __table_args__ = (
+        db.Index("ix_delivery_payment_deposit_pay_date", "pay_id", "date"),
+    )
+
     def __repr__(self):
         return f"DeliveryPaymentDeposit('{self.ref_no}')"
 
@@ -928,11 +1026,72 @@ class DeliveryPaymentFine(db.Model):
         "DeliveryPaymentArrears", backref="deliverypaymentfine", lazy=True
     )
 
+    __table_args__ = (
+        db.Index("ix_delivery_payment_fine_pay_date", "pay_id", "date"),
+    )
 
     def __repr__(self):
         return f" DeliveryPaymentFine('{self.ref_no}')"
 
 
+# Change of a deliverer balance, append only
+# One entry per balance column a COD collection, deposit, arrear, fine
+# or withdrawal changed
+class DeliveryLedger(db.Model):
+
+    id = db.Column(db.BigInteger, primary_key=True)
+    kind = db.Column(db.String(10), nullable=False)  # cod, deposit, withdrawal, arrear, fine
+    balance = db.Column(db.String(12), nullable=False)  # DeliveryPayment column
+    amount = db.Column(
+        db.Numeric(precision=12, scale=2, asdecimal=True, decimal_return_scale=None),
+        nullable=False,
+    )  # Signed change
+    ref_no = db.Column(db.String(20), nullable=True)
+    order_id = db.Column(db.Integer, db.ForeignKey("order.id"), nullable=True)
+    date = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    deliverer_id = db.Column(
+        db.Integer, db.ForeignKey("delivery_user.id"), nullable=False
+    )
+
+    __table_args__ = (
+        db.Index("ix_delivery_ledger_deliverer", "deliverer_id", "id"),
+    )
+
+    def __repr__(self):
+        return f"DeliveryLedger('{self.id}')"
+
+
+# Deliverer balances after a ledger entry
+# Balance at a time is the snapshot before it plus the ledger entries after
+class DeliveryLedgerSnapshot(db.Model):
+
+    id = db.Column(db.Integer, primary_key=True)
+    ledger_id = db.Column(db.BigInteger, nullable=False)  # 0 for opening balances
+    earn = db.Column(
+        db.Numeric(precision=12, scale=2, asdecimal=True, decimal_return_scale=None)
+    )
+    arrears = db.Column(
+        db.Numeric(precision=12, scale=2, asdecimal=True, decimal_return_scale=None)
+    )
+    cash_in_hand = db.Column(
+        db.Numeric(precision=12, scale=2, asdecimal=True, decimal_return_scale=None)
+    )
+    fine = db.Column(
+        db.Numeric(precision=12, scale=2, asdecimal=True, decimal_return_scale=None)
+    )
+    date = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    deliverer_id = db.Column(
+        db.Integer, db.ForeignKey("delivery_user.id"), nullable=False
+    )
+
+    __table_args__ = (
+        db.Index("ix_delivery_ledger_snapshot_deliverer", "deliverer_id", "ledger_id"),
+    )
+
+    def __repr__(self):
+        return f"DeliveryLedgerSnapshot('{self.id}')"
+
+
 #  Deliverer Blacklist tockents
 class DeliveryBlacklistToken(db.Model):
 
@@ -1589,6 +1748,7 @@ class OrderMobile(db.Model):
     prep_duration = db.Column(db.Float, nullable=True)  # Seller action
     is_ready = db.Column(db.Boolean, nullable=False, default=False)  # Seller action
     is_pick = db.Column(db.Boolean, nullable=False, default=False)  # Deliverer action
+    pick_time = db.Column(db.DateTime, nullable=True)  # Set with is_pick
     is_ship = db.Column(db.Boolean, nullable=False, default=False)  # Seller action
     ship_time = db.Column(db.DateTime, nullable=True, default=datetime.utcnow)
     is_deliver = db.Column(
@@ -1601,15 +1761,46 @@ class OrderMobile(db.Model):
     )
     latitude = db.Column(db.Float, nullable=False)  # Customer location
     longitude = db.Column(db.Float, nullable=False)  # Customer Location
+    state = db.Column(
+        db.SmallInteger, nullable=False, default=0, server_default=db.text("0")
+    )  # Lifecycle state, see util.order_state
     timestamp = db.Column(
         db.TIMESTAMP,
         server_default=db.text("CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP"),
     )
 
+    __table_args__ = (
+        db.Index("ix_order_mobile_deliverer_state", "deliverer_id", "state", "order_id"),
+        db.Index("ix_order_mobile_deliverer_timestamp", "deliverer_id", "timestamp"),
+    )
+
     def __repr__(self):
         return f"OrderMobile('{self.id}')"
 
 
+# Order taken away from a deliverer, kept so delta sync can remove it
+# Written by the order_mobile_release trigger whenever deliverer_id of an
+# assigned order changes, whoever makes the change
+class OrderMobileRelease(db.Model):
+
+    id = db.Column(db.BigInteger, primary_key=True)
+    order_id = db.Column(db.Integer, db.ForeignKey("order.id"), nullable=False)
+    deliverer_id = db.Column(
+        db.Integer, db.ForeignKey("delivery_user.id"), nullable=False
+    )
+    timestamp = db.Column(
+        db.TIMESTAMP,
+        server_default=db.text("CURRENT_TIMESTAMP"),
+    )
+
+    __table_args__ = (
+        db.Index("ix_order_mobile_release_deliverer_timestamp", "deliverer_id", "timestamp"),
+    )
+
+    def __repr__(self):
+        return f"OrderMobileRelease('{self.id}')"
+
+
 # Order addon
 # Delivere action update for seller
 class OrderDeliveryAction(db.Model):
@@ -1813,6 +2004,7 @@ class OrderReturn(db.Model):
     is_accept = db.Column(db.Boolean, nullable=False, default=False)  # Admin action
     is_reject = db.Column(db.Boolean, nullable=False, default=False)  # Admin action
     is_pick = db.Column(db.Boolean, nullable=False, default=False)  # Deliverer action
+    pick_time = db.Column(db.DateTime, nullable=True)  # Set with is_pick
     is_deliver = db.Column(
         db.Boolean, nullable=False, default=False
     )  # Deliverer action
@@ -1823,11 +2015,20 @@ class OrderReturn(db.Model):
     deliverer_id = db.Column(
         db.Integer, db.ForeignKey("delivery_user.id"), nullable=True
     )
+    state = db.Column(
+        db.SmallInteger, nullable=False, default=0, server_default=db.text("0")
+    )  # Lifecycle state, see util.order_state
     timestamp = db.Column(
         db.TIMESTAMP,
         server_default=db.text("CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP"),
     )
 
+    __table_args__ = (
+        db.Index("ix_order_return_deliverer_state", "deliverer_id", "state", "order_id"),
+        db.Index("ix_order_return_deliverer_timestamp", "deliverer_id", "timestamp"),
+        db.Index("ix_order_return_deliverer_date", "deliverer_id", "date", "id"),
+    )
+
     # OrderReturnGrocery one to many
     return_grocery = db.relationship(
         "OrderReturnGrocery", backref="orderreturn", lazy=True
@@ -2463,3 +2664,18 @@ class Cupon(db.Model):
 
     def __repr__(self):
         return f"Cupon('{self.ref_no}')"
+
+
+# Next free reference number of each ref_no prefix
+# Workers reserve blocks of numbers from here, see helpers.gen_ref_key
+class RefSequence(db.Model):
+
+    name = db.Column(db.String(10), primary_key=True)
+    next_value = db.Column(db.BigInteger, nullable=False)
+    timestamp = db.Column(
+        db.TIMESTAMP,
+        server_default=db.text("CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP"),
+    )
+
+    def __repr__(self):
+        return f"RefSequence('{self.name}')"
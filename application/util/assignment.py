@@ -0,0 +1,63 @@
+"""Minimum cost assignment of rows to columns."""
+import numpy as np
+
+
+# Hungarian method with shortest augmenting paths, O(n^2 m)
+# Rows are assigned to distinct columns, inf marks a forbidden pair
+# Returns (row, col) pairs, rows without an allowed column are left out
+def min_cost_assignment(cost):
+    cost = np.asarray(cost, dtype=float)
+    if cost.size == 0:
+        return []
+    transposed = cost.shape[0] > cost.shape[1]
+    if transposed:
+        cost = cost.T
+    n, m = cost.shape
+
+    # Forbidden pairs cost more than any allowed assignment
+    allowed = np.isfinite(cost)
+    if not allowed.any():
+        return []
+    big = (np.abs(cost[allowed]).max() + 1) * (n + 1)
+    c = np.where(allowed, cost, big)
+
+    # Index 0 is a virtual column holding the row being added
+    u = np.zeros(n + 1)
+    v = np.zeros(m + 1)
+    col_row = np.zeros(m + 1, dtype=int)
+    way = np.zeros(m + 1, dtype=int)
+    for i in range(1, n + 1):
+        col_row[0] = i
+        j0 = 0
+        minv = np.full(m + 1, np.inf)
+        used = np.zeros(m + 1, dtype=bool)
+        while True:
+            used[j0] = True
+            i0 = col_row[j0]
+            free = ~used
+            free[0] = False
+            reduced = np.full(m + 1, np.inf)
+            reduced[1:] = c[i0 - 1] - u[i0] - v[1:]
+            better = free & (reduced < minv)
+            minv[better] = reduced[better]
+            way[better] = j0
+            j1 = int(np.argmin(np.where(free, minv, np.inf)))
+            delta = minv[j1]
+            u[col_row[used]] += delta
+            v[used] -= delta
+            minv[free] -= delta
+            j0 = j1
+            if col_row[j0] == 0:
+                break
+        # Flip the augmenting path
+        while j0:
+            j1 = way[j0]
+            col_row[j0] = col_row[j1]
+            j0 = j1
+
+    pairs = []
+    for j in range(1, m + 1):
+        i = int(col_row[j])
+        if i and allowed[i - 1, j - 1]:
+            pairs.append((j - 1, i - 1) if transposed else (i - 1, j - 1))
+    return sorted(pairs)
@@ -0,0 +1,43 @@
+"""Shared Redis client and backend selection of the util extensions.
+
+The event stream, location buffer, position registry and cache keep
+their state in Redis when REDIS_URL is set so all workers share it, and
+in process otherwise and in tests. One client, and so one connection
+pool, per app is shared by all of them.
+"""
+import redis
+
+
+# Redis client of the app from REDIS_URL, None when not set
+def redis_client(app):
+    if "redis" not in app.extensions:
+        url = app.config.get("REDIS_URL")
+        app.extensions["redis"] = (
+            redis.Redis.from_url(url, decode_responses=True) if url else None
+        )
+    return app.extensions["redis"]
+
+
+# Flask extension with a Redis or an in process backend
+# Subclasses set name and build the two backends from app config
+class BackendExtension:
+    name = None
+
+    def __init__(self, app=None):
+        self.backend = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        client = redis_client(app)
+        if client is not None:
+            self.backend = self.redis_backend(client, app.config)
+        else:
+            self.backend = self.memory_backend(app.config)
+        app.extensions[self.name] = self
+
+    def redis_backend(self, client, config):
+        raise NotImplementedError
+
+    def memory_backend(self, config):
+        raise NotImplementedError
@@ -0,0 +1,124 @@
+"""Key value cache with expiry for values that are costly to compute.
+
+Values must be JSON serialisable. Redis strings back it with REDIS_URL,
+an in process dict bounded by CACHE_MAX_ITEMS otherwise.
+"""
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from application.util.backend import BackendExtension
+
+
+# In process dict, expired keys are dropped on read
+# Over max_items expired keys are purged first, then least recently used
+class MemoryBackend:
+    def __init__(self, max_items):
+        self._max_items = max_items
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_many(self, keys):
+        now = time.monotonic()
+        with self._lock:
+            found = {}
+            for key in keys:
+                item = self._items.get(key)
+                if item is None:
+                    continue
+                if item[1] < now:
+                    del self._items[key]
+                else:
+                    self._items.move_to_end(key)
+                    found[key] = item[0]
+            return found
+
+    def set_many(self, items, ttl):
+        now = time.monotonic()
+        with self._lock:
+            for key, value in items.items():
+                self._put(key, value, now + ttl)
+            self._evict(now)
+
+    def add(self, key, value, ttl):
+        now = time.monotonic()
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None and item[1] >= now:
+                return False
+            self._put(key, value, now + ttl)
+            self._evict(now)
+            return True
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._items.pop(key, None)
+
+    def _put(self, key, value, expires):
+        self._items[key] = (json.loads(json.dumps(value)), expires)
+        self._items.move_to_end(key)
+
+    def _evict(self, now):
+        if len(self._items) <= self._max_items:
+            return
+        for key in [k for k, item in self._items.items() if item[1] < now]:
+            del self._items[key]
+        while len(self._items) > self._max_items:
+            self._items.popitem(last=False)
+
+
+# Redis strings with expiry
+class RedisBackend:
+    def __init__(self, client):
+        self._redis = client
+
+    def get_many(self, keys):
+        values = self._redis.mget(keys)
+        return {k: json.loads(v) for k, v in zip(keys, values) if v is not None}
+
+    def set_many(self, items, ttl):
+        pipe = self._redis.pipeline()
+        for key, value in items.items():
+            pipe.set(key, json.dumps(value), ex=ttl)
+        pipe.execute()
+
+    def add(self, key, value, ttl):
+        return bool(self._redis.set(key, json.dumps(value), ex=ttl, nx=True))
+
+    def delete(self, *keys):
+        self._redis.delete(*keys)
+
+
+# Flask extension over the selected backend
+class Cache(BackendExtension):
+    name = "cache"
+
+    def redis_backend(self, client, config):
+        return RedisBackend(client)
+
+    def memory_backend(self, config):
+        return MemoryBackend(config.get("CACHE_MAX_ITEMS"))
+
+    def get(self, key):
+        return self.backend.get_many([key]).get(key)
+
+    def set(self, key, value, ttl):
+        self.backend.set_many({key: value}, ttl)
+
+    # Set key only when it is not set, returns whether it was set
+    def add(self, key, value, ttl):
+        return self.backend.add(key, value, ttl)
+
+    # Cached values of the keys found, missing keys are left out
+    def get_many(self, keys):
+        return self.backend.get_many(list(keys)) if keys else {}
+
+    def set_many(self, items, ttl):
+        if items:
+            self.backend.set_many(items, ttl)
+
+    def delete(self, *keys):
+        if keys:
+            self.backend.delete(*keys)
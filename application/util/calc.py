@@ -1,16 +1,57 @@
 """Common calculation of the system"""
 import math
 
+import numpy as np
+
+EARTH_RADIUS_KM = 6371
+
+_math = math
+
+
+# Haversine distance kernel
+# Takes radians, inputs broadcast against each other
+def _haversine(long_1, lati_1, long_2, lati_2):
+    d_lati = lati_2 - lati_1
+    d_long = long_2 - long_1
+    a = (
+        np.sin(d_lati / 2) ** 2
+        + np.cos(lati_1) * np.cos(lati_2) * np.sin(d_long / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+# Great circle distance from one origin to N points in km
+def gc_distances(long_1, lati_1, longs, latis):
+    return _haversine(
+        math.radians(long_1),
+        math.radians(lati_1),
+        np.radians(np.asarray(longs, dtype=float)),
+        np.radians(np.asarray(latis, dtype=float)),
+    )
+
+
+# Great circle distance matrix in km, rows are points a and columns points b
+def gc_distance_matrix(longs_a, latis_a, longs_b, latis_b):
+    longs_a = np.radians(np.asarray(longs_a, dtype=float))[:, None]
+    latis_a = np.radians(np.asarray(latis_a, dtype=float))[:, None]
+    longs_b = np.radians(np.asarray(longs_b, dtype=float))[None, :]
+    latis_b = np.radians(np.asarray(latis_b, dtype=float))[None, :]
+    return _haversine(longs_a, latis_a, longs_b, latis_b)
+
+
 # Calculate great circle distance
+# Pass math=func to build the SQL expression instead
 def gc_distance(long_1, lati_1, long_2, lati_2, math=math):
-    ang = math.acos(
-        math.cos(math.radians(lati_1))
-        * math.cos(math.radians(lati_2))
-        * math.cos(math.radians(long_2) - math.radians(long_1))
-        + math.sin(math.radians(lati_1)) * math.sin(math.radians(lati_2))
-    )
-    return 6371 * ang
+    if math is not _math:
+        ang = math.acos(
+            math.cos(math.radians(lati_1))
+            * math.cos(math.radians(lati_2))
+            * math.cos(math.radians(long_2) - math.radians(long_1))
+            + math.sin(math.radians(lati_1)) * math.sin(math.radians(lati_2))
+        )
+        return EARTH_RADIUS_KM * ang
+    return float(gc_distances(long_1, lati_1, [long_2], [lati_2])[0])
 
 # Calculaate rate
 def rate_cal(dividend, divisor):
-    return dividend/divisor
\ No newline at end of file
+    return dividend/divisor
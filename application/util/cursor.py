@@ -0,0 +1,43 @@
+"""Opaque cursor tokens used for keyset pagination and sync."""
+import base64
+import binascii
+import json
+from datetime import datetime
+
+# isoformat output with and without microseconds
+_DATETIME_FORMATS = ("%Y-%m-%dT%H:%M:%S.%f", "%Y-%m-%dT%H:%M:%S")
+
+
+# Encode key values of the last row into an url safe token
+def encode_cursor(*values):
+    raw = json.dumps(
+        [v.isoformat() if isinstance(v, datetime) else v for v in values]
+    )
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+# Decode token back into key values
+# Raise ValueError on malformed token or values of the wrong type
+def decode_cursor(token, *types):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(token.encode()).decode())
+        if not isinstance(values, list) or len(values) != len(types):
+            raise ValueError
+        return [_decode_value(v, t) for v, t in zip(values, types)]
+    except (TypeError, ValueError, KeyError, binascii.Error):
+        raise ValueError("invalid_cursor")
+
+
+def _decode_value(value, type_):
+    if type_ is datetime:
+        if not isinstance(value, str):
+            raise TypeError
+        for fmt in _DATETIME_FORMATS:
+            try:
+                return datetime.strptime(value, fmt)
+            except ValueError:
+                pass
+        raise ValueError
+    if type_ is int and (not isinstance(value, int) or isinstance(value, bool)):
+        raise TypeError
+    return type_(value)
@@ -0,0 +1,28 @@
+"""Pickup and drop time estimates of a delivery."""
+from datetime import timedelta
+
+from application.util.calc import gc_distance
+
+
+# Minutes to travel between two (latitude, longitude) points
+# Great circle distance is stretched by route_factor to road distance
+def travel_minutes(origin, target, speed_kmh, route_factor):
+    distance = gc_distance(origin[1], origin[0], target[1], target[0]) * route_factor
+    return distance / speed_kmh * 60
+
+
+# Pickup and drop time of an order as datetimes
+# rider is None when the deliverer position is unknown, travel to the
+# pickup is then left out. Pickup is None once the order is picked
+def estimate(now, ready_at, rider, seller, customer, speed_kmh, route_factor, picked=False):
+    if picked:
+        origin = rider or seller
+        drop = now + timedelta(minutes=travel_minutes(origin, customer, speed_kmh, route_factor))
+        return None, drop
+
+    arrive = now
+    if rider:
+        arrive += timedelta(minutes=travel_minutes(rider, seller, speed_kmh, route_factor))
+    pickup = max(ready_at, arrive)
+    drop = pickup + timedelta(minutes=travel_minutes(seller, customer, speed_kmh, route_factor))
+    return pickup, drop
@@ -0,0 +1,66 @@
+"""Geohash cells used to prefilter locations before exact distance."""
+import math
+
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+_KM_PER_DEG_LAT = 111.32
+
+# Geohash length stored on location tables
+CELL_PRECISION = 12
+
+
+# Encode latitude and longitude into geohash of given length
+# Same result as MySQL ST_GeoHash(longitude, latitude, precision)
+def encode(latitude, longitude, precision=CELL_PRECISION):
+    lat_rng = [-90.0, 90.0]
+    lon_rng = [-180.0, 180.0]
+    cell = []
+    bits = 0
+    bit_count = 0
+    even = True
+    while len(cell) < precision:
+        rng, val = (lon_rng, longitude) if even else (lat_rng, latitude)
+        mid = (rng[0] + rng[1]) / 2
+        if val >= mid:
+            bits = bits * 2 + 1
+            rng[0] = mid
+        else:
+            bits = bits * 2
+            rng[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            cell.append(_BASE32[bits])
+            bits = 0
+            bit_count = 0
+    return "".join(cell)
+
+
+# Height and width of a cell in degrees
+def cell_size(precision):
+    lon_bits = math.ceil(precision * 5 / 2)
+    lat_bits = math.floor(precision * 5 / 2)
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lon_bits
+
+
+# Longest prefix whose cell at latitude is not smaller than radius_km
+def cover_precision(latitude, radius_km):
+    km_per_deg_lon = _KM_PER_DEG_LAT * max(math.cos(math.radians(latitude)), 0.01)
+    for p in range(CELL_PRECISION, 0, -1):
+        lat_deg, lon_deg = cell_size(p)
+        if lat_deg * _KM_PER_DEG_LAT >= radius_km and lon_deg * km_per_deg_lon >= radius_km:
+            return p
+    return 1
+
+
+# Cell prefixes covering a circle of radius_km around the point
+# The cell of the point at cover_precision and its 8 neighbours cover the circle
+def cover(latitude, longitude, radius_km):
+    precision = cover_precision(latitude, radius_km)
+    lat_deg, lon_deg = cell_size(precision)
+    cells = set()
+    for d_lat in (-lat_deg, 0, lat_deg):
+        for d_lon in (-lon_deg, 0, lon_deg):
+            lat = min(max(latitude + d_lat, -90.0), 89.999999)
+            lon = (longitude + d_lon + 180.0) % 360.0 - 180.0
+            cells.add(encode(lat, lon, precision))
+    return sorted(cells)
@@ -0,0 +1,94 @@
+"""Bounded buffer of location fixes written to the database in batches.
+
+Fixes are kept in a ring so a slow or unavailable database drops the
+oldest fixes instead of growing memory. A Redis list backs it with
+REDIS_URL, a per worker deque otherwise. The buffer reports when it is due for a flush,
+by number of fixes or by time since the last flush, the caller drains
+and writes it.
+"""
+import json
+import threading
+import time
+from collections import deque
+
+from application.util.backend import BackendExtension
+
+
+# Per worker ring
+class MemoryBackend:
+    def __init__(self, maxlen):
+        self._ring = deque(maxlen=maxlen)
+        self._lock = threading.Lock()
+
+    def push(self, rows):
+        with self._lock:
+            self._ring.extend(rows)
+            return len(self._ring)
+
+    def drain(self, count):
+        with self._lock:
+            count = min(count, len(self._ring))
+            return [self._ring.popleft() for _ in range(count)]
+
+
+# Redis list shared by workers, trimmed to the newest maxlen fixes
+class RedisBackend:
+    def __init__(self, client, key, maxlen):
+        self._key = key
+        self._maxlen = maxlen
+        self._redis = client
+
+    def push(self, rows):
+        pipe = self._redis.pipeline()
+        pipe.rpush(self._key, *[json.dumps(row) for row in rows])
+        pipe.ltrim(self._key, -self._maxlen, -1)
+        pipe.llen(self._key)
+        return pipe.execute()[-1]
+
+    def drain(self, count):
+        pipe = self._redis.pipeline()
+        pipe.lrange(self._key, 0, count - 1)
+        pipe.ltrim(self._key, count, -1)
+        items, _ = pipe.execute()
+        return [json.loads(item) for item in items]
+
+
+# Flask extension over the selected backend
+class LocationBuffer(BackendExtension):
+    name = "locations"
+
+    def init_app(self, app):
+        self.flush_size = app.config.get("LOCATION_FLUSH_SIZE")
+        self.flush_interval = app.config.get("LOCATION_FLUSH_INTERVAL")
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        super().init_app(app)
+
+    def redis_backend(self, client, config):
+        return RedisBackend(client, "location:buffer", config.get("LOCATION_BUFFER_LENGTH"))
+
+    def memory_backend(self, config):
+        return MemoryBackend(config.get("LOCATION_BUFFER_LENGTH"))
+
+    # Add fixes, return True when the buffer is due for a flush
+    def push(self, rows):
+        size = self.backend.push(rows)
+        if size >= self.flush_size:
+            return True
+        return time.monotonic() - self._last_flush >= self.flush_interval
+
+    # Take up to flush_size fixes, oldest first
+    # Only one thread of the worker drains at a time, others skip
+    def drain(self):
+        if not self._lock.acquire(blocking=False):
+            return []
+        try:
+            self._last_flush = time.monotonic()
+            return self.backend.drain(self.flush_size)
+        finally:
+            self._lock.release()
+
+    # Put back fixes that could not be written
+    def restore(self, rows):
+        if rows:
+            self.backend.push(rows)
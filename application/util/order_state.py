@@ -0,0 +1,49 @@
+"""Delivery lifecycle state of mobile orders and returns."""
+
+PENDING = 0  # Waiting for deliverer
+ACCEPTED = 1  # Deliverer assigned
+PICKED = 2  # Deliverer action
+DELIVERED = 3  # Deliverer action
+RECEIVED = 4  # Customer or seller confirmed
+COMPLETED = 5  # Settled
+CANCELLED = 9  # Rejected or cancelled
+
+# Deliverer actions on orders as (states allowed before, state after)
+ORDER_TRANSITIONS = {
+    "accept": ((PENDING,), ACCEPTED),
+    "pickup": ((ACCEPTED,), PICKED),
+    "deliver": ((PICKED,), DELIVERED),
+}
+
+# Deliverer actions on returns, returns are assigned by admin
+RETURN_TRANSITIONS = {
+    "pickup": ((PENDING, ACCEPTED), PICKED),
+    "deliver": ((PICKED,), DELIVERED),
+}
+
+# Action flags kept in sync with the state
+STATE_FLAGS = {
+    PICKED: {"is_pick": True},
+    DELIVERED: {"is_deliver": True},
+}
+
+# Time columns set to the transition time, on models that have them
+STATE_TIMES = {
+    PICKED: "pick_time",
+}
+
+# States shown to deliverer by name
+STATE_NAMES = {
+    "pending": (PENDING, ACCEPTED),
+    "picked": (PICKED,),
+    "delivered": (DELIVERED, RECEIVED, COMPLETED),
+    "cancelled": (CANCELLED,),
+}
+
+
+# Name of state shown to deliverer
+def state_name(state):
+    for name, states in STATE_NAMES.items():
+        if state in states:
+            return name
+    return "pending"
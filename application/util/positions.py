@@ -0,0 +1,156 @@
+"""Latest position of online deliverers with expiry and radius lookup.
+
+Only the newest fix of each deliverer is kept, it expires after a TTL
+so riders that stop reporting drop out of lookups. Positions are
+indexed by geohash so a radius lookup only checks riders in the cells
+covering the circle. A Redis geo set backs it with REDIS_URL, an in
+process index otherwise.
+"""
+import bisect
+import threading
+import time
+
+from application.util.backend import BackendExtension
+from application.util.calc import gc_distances
+from application.util.geohash import cover, encode
+
+
+# In process index, geohash sorted list searched by cell prefix
+class MemoryBackend:
+    def __init__(self, ttl):
+        self._ttl = ttl
+        self._pos = {}
+        self._cells = []
+        self._lock = threading.Lock()
+
+    def update(self, rider_id, latitude, longitude, now):
+        with self._lock:
+            self._drop(rider_id)
+            cell = encode(latitude, longitude)
+            self._pos[rider_id] = (latitude, longitude, now, cell)
+            bisect.insort(self._cells, (cell, rider_id))
+
+    def remove(self, rider_id):
+        with self._lock:
+            self._drop(rider_id)
+
+    def get(self, rider_id, now):
+        with self._lock:
+            pos = self._pos.get(rider_id)
+            if pos is None or pos[2] < now - self._ttl:
+                return None
+            return pos[0], pos[1], pos[2]
+
+    def within(self, latitude, longitude, radius_km, now):
+        with self._lock:
+            found = []
+            expired = []
+            for prefix in cover(latitude, longitude, radius_km):
+                lo = bisect.bisect_left(self._cells, (prefix,))
+                hi = bisect.bisect_left(self._cells, (prefix + "~",))
+                for _, rider_id in self._cells[lo:hi]:
+                    pos = self._pos[rider_id]
+                    if pos[2] < now - self._ttl:
+                        expired.append(rider_id)
+                    else:
+                        found.append((rider_id, pos[0], pos[1]))
+            for rider_id in expired:
+                self._drop(rider_id)
+            return found
+
+    def _drop(self, rider_id):
+        pos = self._pos.pop(rider_id, None)
+        if pos is not None:
+            i = bisect.bisect_left(self._cells, (pos[3], rider_id))
+            del self._cells[i]
+
+
+# Redis geo set of positions and sorted set of last seen times
+class RedisBackend:
+    def __init__(self, client, ttl):
+        self._ttl = ttl
+        self._geo = "position:geo"
+        self._seen = "position:seen"
+        self._redis = client
+
+    def update(self, rider_id, latitude, longitude, now):
+        pipe = self._redis.pipeline()
+        pipe.geoadd(self._geo, (longitude, latitude, rider_id))
+        pipe.zadd(self._seen, {rider_id: now})
+        pipe.execute()
+
+    def remove(self, rider_id):
+        pipe = self._redis.pipeline()
+        pipe.zrem(self._geo, rider_id)
+        pipe.zrem(self._seen, rider_id)
+        pipe.execute()
+
+    def get(self, rider_id, now):
+        pipe = self._redis.pipeline()
+        pipe.geopos(self._geo, rider_id)
+        pipe.zscore(self._seen, rider_id)
+        (pos,), seen = pipe.execute()
+        if pos is None or seen is None or seen < now - self._ttl:
+            return None
+        return pos[1], pos[0], seen
+
+    def within(self, latitude, longitude, radius_km, now):
+        self._expire(now)
+        found = self._redis.geosearch(
+            self._geo,
+            longitude=longitude,
+            latitude=latitude,
+            radius=radius_km,
+            unit="km",
+            withcoord=True,
+        )
+        return [(int(rider_id), lat, lon) for rider_id, (lon, lat) in found]
+
+    def _expire(self, now):
+        expired = self._redis.zrangebyscore(self._seen, "-inf", now - self._ttl)
+        if expired:
+            pipe = self._redis.pipeline()
+            pipe.zrem(self._geo, *expired)
+            pipe.zrem(self._seen, *expired)
+            pipe.execute()
+
+
+# Flask extension over the selected backend
+class PositionRegistry(BackendExtension):
+    name = "positions"
+
+    def redis_backend(self, client, config):
+        return RedisBackend(client, config.get("POSITION_TTL"))
+
+    def memory_backend(self, config):
+        return MemoryBackend(config.get("POSITION_TTL"))
+
+    # Set newest position of a deliverer seen at seen_at, now when not given
+    # A seen_at ahead of the clock counts as now so the TTL is not stretched
+    def update(self, rider_id, latitude, longitude, seen_at=None):
+        now = time.time()
+        seen_at = now if seen_at is None else min(seen_at, now)
+        self.backend.update(rider_id, latitude, longitude, seen_at)
+
+    # Take deliverer offline
+    def remove(self, rider_id):
+        self.backend.remove(rider_id)
+
+    # Position as (latitude, longitude, seen_at), None when offline
+    def get(self, rider_id):
+        return self.backend.get(rider_id, time.time())
+
+    # Online deliverers within radius_km as (rider_id, distance_km), nearest first
+    def within(self, latitude, longitude, radius_km):
+        found = self.backend.within(latitude, longitude, radius_km, time.time())
+        if not found:
+            return []
+        dists = gc_distances(
+            longitude, latitude, [f[2] for f in found], [f[1] for f in found]
+        )
+        riders = [
+            (rider_id, float(dist))
+            for (rider_id, _, _), dist in zip(found, dists)
+            if dist <= radius_km
+        ]
+        return sorted(riders, key=lambda r: r[1])
@@ -0,0 +1,117 @@
+"""Publish and subscribe of events with resumable event ids.
+
+Events of a channel are kept in a bounded stream so a subscriber can
+resume from the last event id it saw. Redis streams back it with
+REDIS_URL, an in process stream otherwise.
+
+In process ids are milliseconds since the epoch, bumped when two events
+share a millisecond, so ids keep growing over a restart. Events of the
+in process stream do not survive a restart, a subscriber resuming from
+an id of before the restart gets the events published since.
+"""
+import json
+import re
+import threading
+import time
+from collections import deque
+
+from application.util.backend import BackendExtension
+
+
+# In process stream, single worker and tests
+class MemoryBackend:
+    def __init__(self, maxlen):
+        self._maxlen = maxlen
+        self._streams = {}
+        self._seq = 0
+        self._cond = threading.Condition()
+
+    def publish(self, channel, event, data):
+        with self._cond:
+            self._seq = max(self._seq + 1, int(time.time() * 1000))
+            stream = self._streams.setdefault(channel, deque(maxlen=self._maxlen))
+            stream.append((str(self._seq), event, data))
+            self._cond.notify_all()
+            return str(self._seq)
+
+    def last_id(self, channel):
+        with self._cond:
+            stream = self._streams.get(channel)
+            return stream[-1][0] if stream else "0"
+
+    def valid_id(self, event_id):
+        return event_id.isdigit()
+
+    def read(self, channel, last_id, timeout):
+        with self._cond:
+            self._cond.wait_for(lambda: self._after(channel, last_id), timeout)
+            return self._after(channel, last_id)
+
+    def _after(self, channel, last_id):
+        return [
+            item
+            for item in self._streams.get(channel, ())
+            if int(item[0]) > int(last_id)
+        ]
+
+
+# Redis stream entry id, milliseconds with optional sequence
+_REDIS_ID = re.compile(r"[0-9]+(-[0-9]+)?")
+
+
+# Redis stream per channel
+class RedisBackend:
+    def __init__(self, client, maxlen):
+        self._maxlen = maxlen
+        self._redis = client
+
+    def publish(self, channel, event, data):
+        return self._redis.xadd(
+            channel,
+            {"event": event, "data": json.dumps(data)},
+            maxlen=self._maxlen,
+            approximate=True,
+        )
+
+    def last_id(self, channel):
+        last = self._redis.xrevrange(channel, count=1)
+        return last[0][0] if last else "0-0"
+
+    def valid_id(self, event_id):
+        return _REDIS_ID.fullmatch(event_id) is not None
+
+    def read(self, channel, last_id, timeout):
+        streams = self._redis.xread({channel: last_id}, count=100, block=int(timeout * 1000))
+        return [
+            (event_id, fields["event"], json.loads(fields["data"]))
+            for _, items in streams
+            for event_id, fields in items
+        ]
+
+
+# Flask extension over the selected backend
+class EventStream(BackendExtension):
+    name = "events"
+
+    def redis_backend(self, client, config):
+        return RedisBackend(client, config.get("EVENT_STREAM_LENGTH"))
+
+    def memory_backend(self, config):
+        return MemoryBackend(config.get("EVENT_STREAM_LENGTH"))
+
+    # Add event to channel, return its id
+    def publish(self, channel, event, data):
+        return self.backend.publish(channel, event, data)
+
+    # Id of newest event, subscribe from here to get new events only
+    def last_id(self, channel):
+        return self.backend.last_id(channel)
+
+    # Whether event_id can be passed to read, e.g. a Last-Event-ID header
+    def valid_id(self, event_id):
+        return isinstance(event_id, str) and self.backend.valid_id(event_id)
+
+    # Events after last_id as (id, event, data)
+    # Block up to timeout seconds when there is none
+    def read(self, channel, last_id, timeout):
+        return self.backend.read(channel, last_id, timeout)
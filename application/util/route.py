@@ -0,0 +1,84 @@
+"""Visit order planning for multi drop deliveries."""
+import time
+
+
+# Length of open path over distance matrix
+def path_length(dist, path):
+    return sum(dist[path[k], path[k + 1]] for k in range(len(path) - 1))
+
+
+# Plan order to visit every point once starting at index 0
+# dist is a square matrix, index 0 is the start and the path does not return
+# Nearest neighbour seed improved with 2-opt and Or-opt until no move
+# improves or time_budget seconds pass
+def plan_route(dist, time_budget=0.2):
+    n = len(dist)
+    if n <= 2:
+        return list(range(1, n))
+    deadline = time.monotonic() + time_budget
+
+    path = _nearest_neighbour(dist)
+    improved = True
+    while improved and time.monotonic() < deadline:
+        improved = _two_opt(dist, path, deadline) or _or_opt(dist, path, deadline)
+    return path[1:]
+
+
+# Greedy seed, always go to the closest unvisited point
+def _nearest_neighbour(dist):
+    path = [0]
+    left = set(range(1, len(dist)))
+    while left:
+        last = path[-1]
+        nxt = min(left, key=lambda k: dist[last, k])
+        path.append(nxt)
+        left.remove(nxt)
+    return path
+
+
+# Reverse a segment when it shortens the path, first improvement
+def _two_opt(dist, path, deadline):
+    n = len(path)
+    for i in range(1, n - 1):
+        if time.monotonic() >= deadline:
+            return False
+        a, b = path[i - 1], path[i]
+        for j in range(i + 1, n):
+            c = path[j]
+            delta = dist[a, c] - dist[a, b]
+            if j + 1 < n:
+                e = path[j + 1]
+                delta += dist[b, e] - dist[c, e]
+            if delta < -1e-9:
+                path[i:j + 1] = reversed(path[i:j + 1])
+                return True
+    return False
+
+
+# Move a run of up to 3 points to another place when it shortens the path
+def _or_opt(dist, path, deadline):
+    n = len(path)
+    for size in (1, 2, 3):
+        for i in range(1, n - size + 1):
+            if time.monotonic() >= deadline:
+                return False
+            seg = path[i:i + size]
+            prev, first, last = path[i - 1], seg[0], seg[-1]
+            nxt = path[i + size] if i + size < n else None
+            removed = dist[prev, first] - (dist[prev, nxt] if nxt is not None else 0)
+            if nxt is not None:
+                removed += dist[last, nxt]
+            rest = path[:i] + path[i + size:]
+            for k in range(len(rest)):
+                if k == i - 1:
+                    continue
+                p = rest[k]
+                q = rest[k + 1] if k + 1 < len(rest) else None
+                for s_first, s_last, s in ((first, last, seg), (last, first, seg[::-1])):
+                    added = dist[p, s_first] - (dist[p, q] if q is not None else 0)
+                    if q is not None:
+                        added += dist[s_last, q]
+                    if added - removed < -1e-9:
+                        path[:] = rest[:k + 1] + s + rest[k + 1:]
+                        return True
+    return False
@@ -0,0 +1,50 @@
+"""seller geocell and lifecycle state columns
+
+Revision ID: 3f1c2a7d9b01
+Revises: 
+Create Date: 2022-07-18 10:12:41.512305
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c2a7d9b01'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('seller_profile', sa.Column('geocell', sa.String(length=12), sa.Computed('ST_GeoHash(longitude, latitude, 12)', persisted=True), nullable=True))
+    op.create_index('ix_seller_profile_geocell', 'seller_profile', ['geocell'], unique=False)
+
+    op.add_column('order_mobile', sa.Column('state', sa.SmallInteger(), server_default=sa.text('0'), nullable=False))
+    op.add_column('order_return', sa.Column('state', sa.SmallInteger(), server_default=sa.text('0'), nullable=False))
+
+    # Derive state from action flags, keep timestamp so delta sync does not resend every row
+    op.execute(
+        "UPDATE order_mobile SET state = CASE"
+        " WHEN is_reject THEN 9 WHEN is_recive THEN 4 WHEN is_deliver THEN 3"
+        " WHEN is_pick THEN 2 WHEN deliverer_id IS NOT NULL THEN 1 ELSE 0 END,"
+        " timestamp = timestamp"
+    )
+    op.execute(
+        "UPDATE order_return SET state = CASE"
+        " WHEN is_cancel OR is_reject THEN 9 WHEN is_complete THEN 5 WHEN is_receive THEN 4"
+        " WHEN is_deliver THEN 3 WHEN is_pick THEN 2 WHEN deliverer_id IS NOT NULL THEN 1 ELSE 0 END,"
+        " timestamp = timestamp"
+    )
+
+    op.create_index('ix_order_mobile_deliverer_state', 'order_mobile', ['deliverer_id', 'state', 'order_id'], unique=False)
+    op.create_index('ix_order_return_deliverer_state', 'order_return', ['deliverer_id', 'state', 'order_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_order_return_deliverer_state', table_name='order_return')
+    op.drop_index('ix_order_mobile_deliverer_state', table_name='order_mobile')
+    op.drop_column('order_return', 'state')
+    op.drop_column('order_mobile', 'state')
+    op.drop_index('ix_seller_profile_geocell', table_name='seller_profile')
+    op.drop_column('seller_profile', 'geocell')
@@ -0,0 +1,43 @@
+"""delivery eta stats
+
+Revision ID: 5a2f8e6c1d47
+Revises: e41d7c9a5b36
+Create Date: 2022-07-22 11:03:18.472690
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5a2f8e6c1d47'
+down_revision = 'e41d7c9a5b36'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('seller_prep_stat',
+    sa.Column('seller_prof', sa.Integer(), nullable=False),
+    sa.Column('samples', sa.Integer(), nullable=False),
+    sa.Column('prep_mean', sa.Float(), nullable=False),
+    sa.Column('timestamp', sa.TIMESTAMP(), server_default=sa.text('CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP'), nullable=True),
+    sa.ForeignKeyConstraint(['seller_prof'], ['seller_profile.id'], ),
+    sa.PrimaryKeyConstraint('seller_prof')
+    )
+    op.create_table('delivery_vehicle_speed_stat',
+    sa.Column('type', sa.String(length=8), nullable=False),
+    sa.Column('samples', sa.Integer(), nullable=False),
+    sa.Column('speed_mean', sa.Float(), nullable=False),
+    sa.Column('timestamp', sa.TIMESTAMP(), server_default=sa.text('CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP'), nullable=True),
+    sa.PrimaryKeyConstraint('type')
+    )
+    op.add_column('order_mobile', sa.Column('pick_time', sa.DateTime(), nullable=True))
+    op.add_column('order_return', sa.Column('pick_time', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    op.drop_column('order_return', 'pick_time')
+    op.drop_column('order_mobile', 'pick_time')
+    op.drop_table('delivery_vehicle_speed_stat')
+    op.drop_table('seller_prep_stat')
@@ -0,0 +1,32 @@
+"""deliverer hot query indexes
+
+Revision ID: 8b5e0d4c6a12
+Revises: 3f1c2a7d9b01
+Create Date: 2022-07-18 11:03:09.204117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b5e0d4c6a12'
+down_revision = '3f1c2a7d9b01'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_order_mobile_deliverer_timestamp', 'order_mobile', ['deliverer_id', 'timestamp'], unique=False)
+    op.create_index('ix_order_return_deliverer_timestamp', 'order_return', ['deliverer_id', 'timestamp'], unique=False)
+    op.create_index('ix_delivery_payment_deliverer', 'delivery_payment', ['deliverer_id', 'id'], unique=False)
+    op.create_index('ix_delivery_payment_arrears_open', 'delivery_payment_arrears', ['pay_id', 'is_receive', 'is_deduct', 'withdrawl_id', 'order_id', 'amount'], unique=False)
+    op.create_index('ix_delivery_payment_cih_open', 'delivery_payment_cash_in_hand', ['pay_id', 'is_deposit', 'order_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_delivery_payment_cih_open', table_name='delivery_payment_cash_in_hand')
+    op.drop_index('ix_delivery_payment_arrears_open', table_name='delivery_payment_arrears')
+    op.drop_index('ix_delivery_payment_deliverer', table_name='delivery_payment')
+    op.drop_index('ix_order_return_deliverer_timestamp', table_name='order_return')
+    op.drop_index('ix_order_mobile_deliverer_timestamp', table_name='order_mobile')
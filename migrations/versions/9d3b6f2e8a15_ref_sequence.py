@@ -0,0 +1,33 @@
+"""ref sequence
+
+Revision ID: 9d3b6f2e8a15
+Revises: 5a2f8e6c1d47
+Create Date: 2022-07-25 09:26:51.118304
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9d3b6f2e8a15'
+down_revision = '5a2f8e6c1d47'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('ref_sequence',
+    sa.Column('name', sa.String(length=10), nullable=False),
+    sa.Column('next_value', sa.BigInteger(), nullable=False),
+    sa.Column('timestamp', sa.TIMESTAMP(), server_default=sa.text('CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP'), nullable=True),
+    sa.PrimaryKeyConstraint('name')
+    )
+    # Continue after numbers given from table counts so far
+    op.execute("INSERT INTO ref_sequence (name, next_value) SELECT 'DP', COUNT(*) + 1 FROM delivery_profile")
+    op.execute("INSERT INTO ref_sequence (name, next_value) SELECT 'DPD', COUNT(*) + 1 FROM delivery_payment_deposit")
+    op.execute("INSERT INTO ref_sequence (name, next_value) SELECT 'DPW', COUNT(*) + 1 FROM delivery_payment_withdrawal")
+
+
+def downgrade():
+    op.drop_table('ref_sequence')
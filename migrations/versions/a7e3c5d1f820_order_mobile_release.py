@@ -0,0 +1,45 @@
+"""order mobile release tombstones
+
+Revision ID: a7e3c5d1f820
+Revises: f2d8a6c3e519
+Create Date: 2022-07-30 11:04:19.218734
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7e3c5d1f820'
+down_revision = 'f2d8a6c3e519'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('order_mobile_release',
+    sa.Column('id', sa.BigInteger(), nullable=False),
+    sa.Column('order_id', sa.Integer(), nullable=False),
+    sa.Column('deliverer_id', sa.Integer(), nullable=False),
+    sa.Column('timestamp', sa.TIMESTAMP(), server_default=sa.text('CURRENT_TIMESTAMP'), nullable=True),
+    sa.ForeignKeyConstraint(['deliverer_id'], ['delivery_user.id'], ),
+    sa.ForeignKeyConstraint(['order_id'], ['order.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_order_mobile_release_deliverer_timestamp', 'order_mobile_release', ['deliverer_id', 'timestamp'], unique=False)
+
+    # Record the old deliverer whenever an assigned order changes hands,
+    # covers admin and seller side changes made outside this API
+    op.execute(
+        "CREATE TRIGGER order_mobile_release AFTER UPDATE ON order_mobile FOR EACH ROW"
+        " INSERT INTO order_mobile_release (order_id, deliverer_id)"
+        " SELECT NEW.order_id, OLD.deliverer_id FROM DUAL"
+        " WHERE OLD.deliverer_id IS NOT NULL"
+        " AND NOT (NEW.deliverer_id <=> OLD.deliverer_id)"
+    )
+
+
+def downgrade():
+    op.execute("DROP TRIGGER order_mobile_release")
+    op.drop_index('ix_order_mobile_release_deliverer_timestamp', table_name='order_mobile_release')
+    op.drop_table('order_mobile_release')
@@ -0,0 +1,63 @@
+"""delivery ledger
+
+Revision ID: b6c4a1d9e273
+Revises: 9d3b6f2e8a15
+Create Date: 2022-07-26 14:52:09.630117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b6c4a1d9e273'
+down_revision = '9d3b6f2e8a15'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('delivery_ledger',
+    sa.Column('id', sa.BigInteger(), nullable=False),
+    sa.Column('kind', sa.String(length=10), nullable=False),
+    sa.Column('balance', sa.String(length=12), nullable=False),
+    sa.Column('amount', sa.Numeric(precision=12, scale=2), nullable=False),
+    sa.Column('ref_no', sa.String(length=20), nullable=True),
+    sa.Column('order_id', sa.Integer(), nullable=True),
+    sa.Column('date', sa.DateTime(), nullable=False),
+    sa.Column('deliverer_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['deliverer_id'], ['delivery_user.id'], ),
+    sa.ForeignKeyConstraint(['order_id'], ['order.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_delivery_ledger_deliverer', 'delivery_ledger', ['deliverer_id', 'id'], unique=False)
+    op.create_table('delivery_ledger_snapshot',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('ledger_id', sa.BigInteger(), nullable=False),
+    sa.Column('earn', sa.Numeric(precision=12, scale=2), nullable=True),
+    sa.Column('arrears', sa.Numeric(precision=12, scale=2), nullable=True),
+    sa.Column('cash_in_hand', sa.Numeric(precision=12, scale=2), nullable=True),
+    sa.Column('fine', sa.Numeric(precision=12, scale=2), nullable=True),
+    sa.Column('date', sa.DateTime(), nullable=False),
+    sa.Column('deliverer_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['deliverer_id'], ['delivery_user.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_delivery_ledger_snapshot_deliverer', 'delivery_ledger_snapshot', ['deliverer_id', 'ledger_id'], unique=False)
+    op.add_column('delivery_payment', sa.Column('ledger_seq', sa.Integer(), server_default=sa.text('0'), nullable=False))
+
+    # Opening balances, the ledger starts from here
+    op.execute(
+        "INSERT INTO delivery_ledger_snapshot "
+        "(ledger_id, earn, arrears, cash_in_hand, fine, date, deliverer_id) "
+        "SELECT 0, earn, arrears, cash_in_hand, fine, UTC_TIMESTAMP(), deliverer_id "
+        "FROM delivery_payment"
+    )
+
+
+def downgrade():
+    op.drop_column('delivery_payment', 'ledger_seq')
+    op.drop_index('ix_delivery_ledger_snapshot_deliverer', table_name='delivery_ledger_snapshot')
+    op.drop_table('delivery_ledger_snapshot')
+    op.drop_index('ix_delivery_ledger_deliverer', table_name='delivery_ledger')
+    op.drop_table('delivery_ledger')
@@ -0,0 +1,24 @@
+"""order return list index
+
+Revision ID: c7a9e3b1f254
+Revises: 8b5e0d4c6a12
+Create Date: 2022-07-20 09:41:27.318870
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c7a9e3b1f254'
+down_revision = '8b5e0d4c6a12'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_order_return_deliverer_date', 'order_return', ['deliverer_id', 'date', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_order_return_deliverer_date', table_name='order_return')
@@ -0,0 +1,38 @@
+"""delivery location
+
+Revision ID: e41d7c9a5b36
+Revises: c7a9e3b1f254
+Create Date: 2022-07-21 10:12:45.904211
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e41d7c9a5b36'
+down_revision = 'c7a9e3b1f254'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('delivery_location',
+    sa.Column('id', sa.BigInteger(), nullable=False),
+    sa.Column('latitude', sa.Float(), nullable=False),
+    sa.Column('longitude', sa.Float(), nullable=False),
+    sa.Column('accuracy', sa.Float(), nullable=True),
+    sa.Column('speed', sa.Float(), nullable=True),
+    sa.Column('heading', sa.Float(), nullable=True),
+    sa.Column('recorded_at', sa.DateTime(), nullable=False),
+    sa.Column('deliverer_id', sa.Integer(), nullable=False),
+    sa.Column('timestamp', sa.TIMESTAMP(), server_default=sa.text('CURRENT_TIMESTAMP'), nullable=True),
+    sa.ForeignKeyConstraint(['deliverer_id'], ['delivery_user.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_delivery_location_deliverer_recorded', 'delivery_location', ['deliverer_id', 'recorded_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_delivery_location_deliverer_recorded', table_name='delivery_location')
+    op.drop_table('delivery_location')
@@ -0,0 +1,28 @@
+"""delivery statement indexes
+
+Revision ID: f2d8a6c3e519
+Revises: b6c4a1d9e273
+Create Date: 2022-07-29 15:12:48.604215
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2d8a6c3e519'
+down_revision = 'b6c4a1d9e273'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_delivery_payment_deposit_pay_date', 'delivery_payment_deposit', ['pay_id', 'date'], unique=False)
+    op.create_index('ix_delivery_payment_fine_pay_date', 'delivery_payment_fine', ['pay_id', 'date'], unique=False)
+    op.create_index('ix_delivery_payment_withdrawal_pay_date', 'delivery_payment_withdrawal', ['pay_id', 'date'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_delivery_payment_withdrawal_pay_date', table_name='delivery_payment_withdrawal')
+    op.drop_index('ix_delivery_payment_fine_pay_date', table_name='delivery_payment_fine')
+    op.drop_index('ix_delivery_payment_deposit_pay_date', table_name='delivery_payment_deposit')
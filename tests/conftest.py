@@ -0,0 +1,6 @@
+import os
+
+# Config is read from the environment when application is first imported,
+# which may be by any test module
+os.environ.setdefault("upload_path", "/tmp")
+os.environ.setdefault("secret_key", "test")
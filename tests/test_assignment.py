@@ -0,0 +1,56 @@
+"""Minimum cost assignment checked against brute force on small matrices."""
+import itertools
+import random
+
+import pytest
+
+from application.util.assignment import min_cost_assignment
+
+INF = float("inf")
+
+
+# Most allowed pairs at the lowest cost over every injective assignment
+def _brute_force(cost):
+    n, m = len(cost), len(cost[0])
+    best = (0, 0.0)
+    if n <= m:
+        options = (zip(range(n), cols) for cols in itertools.permutations(range(m), n))
+    else:
+        options = (zip(rows, range(m)) for rows in itertools.permutations(range(n), m))
+    for pairs in options:
+        allowed = [cost[i][j] for i, j in pairs if cost[i][j] != INF]
+        key = (-len(allowed), sum(allowed))
+        if key < (-best[0], best[1]):
+            best = (len(allowed), sum(allowed))
+    return best
+
+
+@pytest.mark.parametrize("seed", range(60))
+def test_matches_brute_force(seed):
+    rnd = random.Random(seed)
+    n, m = rnd.randint(1, 5), rnd.randint(1, 5)
+    cost = [
+        [INF if rnd.random() < 0.25 else round(rnd.uniform(0, 20), 2) for _ in range(m)]
+        for _ in range(n)
+    ]
+
+    pairs = min_cost_assignment(cost)
+
+    rows = [i for i, _ in pairs]
+    cols = [j for _, j in pairs]
+    assert len(set(rows)) == len(rows) and len(set(cols)) == len(cols)
+    assert all(cost[i][j] != INF for i, j in pairs)
+    count, total = _brute_force(cost)
+    assert len(pairs) == count
+    assert sum(cost[i][j] for i, j in pairs) == pytest.approx(total)
+
+
+def test_empty_and_all_forbidden():
+    assert min_cost_assignment([]) == []
+    assert min_cost_assignment([[INF, INF], [INF, INF]]) == []
+
+
+def test_returns_plain_ints():
+    pairs = min_cost_assignment([[1, 2], [2, 1]])
+    assert pairs == [(0, 0), (1, 1)]
+    assert all(type(v) is int for pair in pairs for v in pair)
@@ -0,0 +1,37 @@
+"""Cursor token encode and decode."""
+from datetime import datetime
+
+import pytest
+
+from application.util.cursor import decode_cursor, encode_cursor
+
+
+@pytest.mark.parametrize(
+    "values, types",
+    [
+        ((datetime(2022, 7, 1, 10, 15), 42), (datetime, int)),
+        ((datetime(2022, 7, 1, 10, 15, 0, 123456), 7), (datetime, int)),
+        ((datetime(2022, 7, 1, 23, 59, 59),), (datetime,)),
+    ],
+)
+def test_round_trip(values, types):
+    token = encode_cursor(*values)
+    assert not set(token) & set("+/")
+    assert decode_cursor(token, *types) == list(values)
+
+
+@pytest.mark.parametrize(
+    "token, types",
+    [
+        ("not a token", (datetime, int)),
+        ("", (datetime, int)),
+        (encode_cursor(datetime(2022, 7, 1)), (datetime, int)),
+        (encode_cursor(datetime(2022, 7, 1), "42"), (datetime, int)),
+        (encode_cursor(datetime(2022, 7, 1), True), (datetime, int)),
+        (encode_cursor(42, 42), (datetime, int)),
+        (encode_cursor("22-07-01 10:15:00", 42), (datetime, int)),
+    ],
+)
+def test_rejects_malformed(token, types):
+    with pytest.raises(ValueError, match="invalid_cursor"):
+        decode_cursor(token, *types)
@@ -0,0 +1,46 @@
+"""Geohash encoding and radius cover."""
+import math
+import random
+
+import pytest
+
+from application.util.calc import gc_distances
+from application.util.geohash import cover, encode
+
+
+def test_encode_known_cells():
+    assert encode(42.6, -5.6, 5) == "ezs42"
+    assert encode(57.64911, 10.40744, 11) == "u4pruydqqvj"
+    assert encode(6.92, 79.86).startswith(encode(6.92, 79.86, 5))
+
+
+@pytest.mark.parametrize(
+    "latitude, longitude, radius_km",
+    [
+        (6.92, 79.86, 0.5),
+        (6.92, 79.86, 5),
+        (51.5, -0.12, 20),
+        (-33.9, 151.2, 100),
+        (0.0, 179.99, 10),
+        (70.0, 25.0, 15),
+    ],
+)
+def test_cover_holds_every_point_in_radius(latitude, longitude, radius_km):
+    rnd = random.Random(f"{latitude},{longitude}")
+    lat_span = radius_km / 111.32
+    lon_span = radius_km / (111.32 * math.cos(math.radians(latitude)))
+    points = [
+        (
+            latitude + rnd.uniform(-lat_span, lat_span),
+            (longitude + rnd.uniform(-lon_span, lon_span) + 180) % 360 - 180,
+        )
+        for _ in range(500)
+    ]
+    dists = gc_distances(longitude, latitude, [p[1] for p in points], [p[0] for p in points])
+
+    prefixes = cover(latitude, longitude, radius_km)
+
+    assert len(prefixes) <= 9
+    for (lat, lon), dist in zip(points, dists):
+        if dist <= radius_km:
+            assert any(encode(lat, lon).startswith(p) for p in prefixes)
@@ -0,0 +1,106 @@
+"""Ledger balances rebuilt by balance_at against the live balances.
+
+Runs on an in memory SQLite database holding only the tables the ledger
+uses. MySQL only column DDL is rewritten for SQLite when they are created.
+"""
+import time
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import BigInteger
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.schema import CreateColumn
+
+# Amounts are exact in MySQL, SQLite round trips them through float
+pytestmark = pytest.mark.filterwarnings("ignore:Dialect sqlite")
+
+SNAPSHOT_EVERY = 3
+CENT = Decimal("0.01")
+
+
+# Auto increment ids of SQLite only work on INTEGER PRIMARY KEY
+@compiles(BigInteger, "sqlite")
+def _sqlite_big_integer(element, compiler, **kw):
+    return "INTEGER"
+
+
+@compiles(CreateColumn, "sqlite")
+def _sqlite_column(element, compiler, **kw):
+    return compiler.visit_create_column(element, **kw).replace(
+        " ON UPDATE CURRENT_TIMESTAMP", ""
+    )
+
+
+@pytest.fixture
+def app():
+    from application import create_app, db
+    from application import models as m
+
+    app = create_app()
+    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite://"
+    app.config["LEDGER_SNAPSHOT_EVERY"] = SNAPSHOT_EVERY
+    tables = [
+        model.__table__
+        for model in (
+            m.DeliveryUser,
+            m.DeliveryPayment,
+            m.DeliveryLedger,
+            m.DeliveryLedgerSnapshot,
+        )
+    ]
+    with app.app_context():
+        db.metadata.create_all(db.engine, tables=tables)
+        db.session.add(m.DeliveryUser(id=1, contact_no="0700000000"))
+        db.session.commit()
+        yield app
+        db.session.remove()
+        db.metadata.drop_all(db.engine, tables=tables)
+
+
+def _live_balances(deliverer_id):
+    from application.api.finance.utils import BALANCE_COLUMNS
+    from application.models import DeliveryPayment
+
+    row = DeliveryPayment.query.filter_by(deliverer_id=deliverer_id).one()
+    return {name: getattr(row, name) or Decimal("0.00") for name in BALANCE_COLUMNS}
+
+
+def _rounded(balances):
+    return {name: Decimal(value).quantize(CENT) for name, value in balances.items()}
+
+
+def test_balance_at_matches_live_balances_across_snapshots(app):
+    from application import db
+    from application.api.finance.utils import add_balance, balance_at
+    from application.models import DeliveryLedgerSnapshot
+
+    changes = [
+        ("cod", dict(cash_in_hand="120.50")),
+        ("earn", dict(earn="30.25", arrears="30.25")),
+        ("deposit", dict(cash_in_hand="-120.50")),
+        ("cod", dict(cash_in_hand="80.00")),
+        ("fine", dict(fine="5.00", arrears="-5.00")),
+        ("withdrawal", dict(arrears="-20.00")),
+        ("earn", dict(earn="12.10", arrears="12.10")),
+    ]
+    history = []
+    for kind, deltas in changes:
+        add_balance(1, kind, **deltas)
+        db.session.commit()
+        live = _rounded(_live_balances(1))
+        assert _rounded(balance_at(1)) == live
+        history.append((datetime.utcnow(), live))
+        time.sleep(0.01)
+
+    # Entries cross several snapshot boundaries, some mid change
+    assert DeliveryLedgerSnapshot.query.count() >= 3
+
+    for at, live in history:
+        assert _rounded(balance_at(1, at)) == live
+
+
+def test_balance_at_before_any_entry(app):
+    from application.api.finance.utils import balance_at
+
+    assert set(balance_at(1).values()) == {Decimal("0.00")}
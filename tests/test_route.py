@@ -0,0 +1,35 @@
+"""Route planner checked against the nearest neighbour baseline."""
+import random
+
+import numpy as np
+import pytest
+
+from application.util.route import _nearest_neighbour, path_length, plan_route
+
+
+def _distances(points):
+    pts = np.asarray(points, dtype=float)
+    return np.sqrt(((pts[:, None, :] - pts[None, :, :]) ** 2).sum(axis=2))
+
+
+@pytest.mark.parametrize("seed", range(30))
+def test_never_longer_than_nearest_neighbour(seed):
+    rnd = random.Random(seed)
+    n = rnd.randint(3, 25)
+    dist = _distances([(rnd.uniform(0, 10), rnd.uniform(0, 10)) for _ in range(n)])
+
+    stops = plan_route(dist, time_budget=1)
+
+    assert sorted(stops) == list(range(1, n))
+    baseline = path_length(dist, _nearest_neighbour(dist))
+    assert path_length(dist, [0] + stops) <= baseline + 1e-9
+
+
+def test_short_inputs():
+    assert plan_route(_distances([(0, 0)])) == []
+    assert plan_route(_distances([(0, 0), (1, 1)])) == [1]
+
+
+def test_straight_line_in_order():
+    dist = _distances([(0, 0), (3, 0), (1, 0), (2, 0)])
+    assert plan_route(dist) == [2, 3, 1]